@@ -9,6 +9,8 @@ from pathlib import Path
 from .config import load_config
 from .utils.logging import write_json, now_iso
 from .constants import ENCODER_NAME
+from .metrics_store import MetricsStore, batch_kpis, empty_kpis, metrics_dir, new_run_id
+from .storage_tier import ARCHIVED_MARKER, GB, MB, BackgroundCompactor, DiskWatermark, batch_lock, publish
 
 def _load_topics(path: str):
     import yaml
@@ -40,66 +42,113 @@ def main():
     (datasets_dir / "sft").mkdir(parents=True, exist_ok=True)
     (datasets_dir / "dpo").mkdir(parents=True, exist_ok=True)
     (datasets_dir / "cards").mkdir(parents=True, exist_ok=True)
+    with batch_lock(runs_dir):
+        # A re-run of an old batch id must not look finished (or archived) to another
+        # process's compactor until its new summary is written.
+        for stale in ("summary.json", ARCHIVED_MARKER):
+            (runs_dir / stale).unlink(missing_ok=True)
 
-    # DRY RUN: fabricate 3 topics × 3 speakers = 9 turns
-    words = (cfg["generator"]["min_words"] + cfg["generator"]["max_words"]) // 2
-    speakers = cfg["personas"]["order"]
-    sft_items = []
-    dpo_items = []
+        # Storage tiering: small I/O on the SSD (runs), large sequential blocks to the HDD
+        st_cfg = cfg.get("storage", {})
+        block_bytes = int(st_cfg.get("block_mb", 8) * MB)
+        compactor = None
+        if st_cfg.get("compact_finished", False):
+            compactor = BackgroundCompactor(
+                Path(cfg["paths"]["runs"]), Path(st_cfg["archive"]), exclude={batch_id}, block_bytes=block_bytes
+            ).start()
+        watermarks = [
+            DiskWatermark(
+                Path(cfg["paths"]["runs"]), int(st_cfg.get("ssd_min_free_gb", 0) * GB),
+                on_low=compactor.nudge if compactor else None, timeout_s=st_cfg.get("throttle_timeout_s", 3600),
+            ),
+            DiskWatermark(datasets_dir, int(st_cfg.get("hdd_min_free_gb", 0) * GB), timeout_s=st_cfg.get("throttle_timeout_s", 3600)),
+        ]
 
-    for t in topics["topics"]:
-        accepted_text = f"({words} verba Latine ficta) {t}. Citationes verae in versione plenaria addentur."
-        rejected_text = f"Textus reiectus pro DPO ad {t} (exempli gratia)."
-        for sp in speakers:
-            turn_id = f"{batch_id}.{uuid.uuid4().hex[:8]}"
-            audit = {"claims": 5, "correct": 4}
-            correct, total = audit.get("correct"), audit.get("claims")
-            audit["support_rate"] = (correct / total) if correct is not None and total else 0.0
-            sft = {
-                "id": turn_id,
-                "instruction": t,
-                "response": accepted_text,
-                "meta": {
-                    "speaker": sp,
-                    "topic": t,
-                    "citations": [{"work":"Summa Theologiae I-II","ref":"q109 a2"}],
-                    "provenance": [{"work":"Summa Theologiae I-II","ref":"q109 a2","snippet":"gratia non tollit naturam"}],
-                    "audit_summary": audit,
-                    "batch_id": batch_id,
-                    "encoder": ENCODER_NAME,
-                    "model": model_name,
-                    "commit": ""
-                }
-            }
-            sft_items.append(sft)
-            dpo_items.append({
-                "id": f"{batch_id}.{uuid.uuid4().hex[:8]}",
-                "prompt": t,
-                "chosen": accepted_text,
-                "rejected": rejected_text,
-                "meta": {"speaker": sp, "topic": t, "batch_id": batch_id, "audit_diffs": "stub"}
-            })
+        try:
+            # DRY RUN: fabricate 3 topics × 3 speakers = 9 turns
+            words = (cfg["generator"]["min_words"] + cfg["generator"]["max_words"]) // 2
+            speakers = cfg["personas"]["order"]
+            sft_items = []
+            dpo_items = []
+            metric_rows = []
+            run_id = new_run_id("gate")
 
-    # Write shard files
-    sft_path = datasets_dir / "sft" / f"{batch_id}.jsonl"
-    dpo_path = datasets_dir / "dpo" / f"{batch_id}.jsonl"
-    with open(sft_path, "w", encoding="utf-8") as f:
-        for it in sft_items:
-            f.write(json.dumps(it, ensure_ascii=False) + "\n")
-    with open(dpo_path, "w", encoding="utf-8") as f:
-        for it in dpo_items:
-            f.write(json.dumps(it, ensure_ascii=False) + "\n")
+            for t in topics["topics"]:
+                for wm in watermarks:
+                    wm.wait()
+                accepted_text = f"({words} verba Latine ficta) {t}. Citationes verae in versione plenaria addentur."
+                rejected_text = f"Textus reiectus pro DPO ad {t} (exempli gratia)."
+                for sp in speakers:
+                    turn_id = f"{batch_id}.{uuid.uuid4().hex[:8]}"
+                    audit = {"claims": 5, "correct": 4}
+                    correct, total = audit.get("correct"), audit.get("claims")
+                    audit["support_rate"] = (correct / total) if correct is not None and total else 0.0
+                    sft = {
+                        "id": turn_id,
+                        "instruction": t,
+                        "response": accepted_text,
+                        "meta": {
+                            "speaker": sp,
+                            "topic": t,
+                            "citations": [{"work":"Summa Theologiae I-II","ref":"q109 a2"}],
+                            "provenance": [{"work":"Summa Theologiae I-II","ref":"q109 a2","snippet":"gratia non tollit naturam"}],
+                            "audit_summary": audit,
+                            "batch_id": batch_id,
+                            "encoder": ENCODER_NAME,
+                            "model": model_name,
+                            "commit": ""
+                        }
+                    }
+                    sft_items.append(sft)
+                    # Dry-run placeholder metrics, recorded as if the gate accepted the turn
+                    metric_rows.append({
+                        "batch_id": batch_id, "run": run_id, "stage": "gate", "speaker": sp, "topic": t,
+                        "words": words, "citations": len(sft["meta"]["citations"]),
+                        "support_rate": audit["support_rate"], "latin_score": 0.25, "novelty": 0.8, "passed": True,
+                    })
+                    dpo_items.append({
+                        "id": f"{batch_id}.{uuid.uuid4().hex[:8]}",
+                        "prompt": t,
+                        "chosen": accepted_text,
+                        "rejected": rejected_text,
+                        "meta": {"speaker": sp, "topic": t, "batch_id": batch_id, "audit_diffs": "stub"}
+                    })
 
-    # Write summary
-    summary = {
-        "batch_id": batch_id,
-        "kpis":{"support_rate_avg":0.8,"latinness_avg":0.25,"citations_avg":1.5,"novelty_max":0.8},
-        "counts":{"topics":len(topics["topics"]),"turns_total":len(topics["topics"])*len(speakers),"accepted":len(topics["topics"])*len(speakers),"rejected":0},
-        "artifacts":{"sft":str(sft_path),"dpo":str(dpo_path)},
-        "versions":{"encoder":ENCODER_NAME,"model":model_name},
-        "created_at": now_iso()
-    }
-    write_json(runs_dir/"summary.json", summary)
+            # Write shard files: stage on the SSD, then publish to the HDD sequentially
+            staging = runs_dir / "staging"
+            staging.mkdir(parents=True, exist_ok=True)
+            sft_path = datasets_dir / "sft" / f"{batch_id}.jsonl"
+            dpo_path = datasets_dir / "dpo" / f"{batch_id}.jsonl"
+            for items, dest in ((sft_items, sft_path), (dpo_items, dpo_path)):
+                staged = staging / dest.name.replace(".jsonl", f".{dest.parent.name}.jsonl")
+                with open(staged, "w", encoding="utf-8") as f:
+                    for it in items:
+                        f.write(json.dumps(it, ensure_ascii=False) + "\n")
+                publish(staged, dest, block_bytes)
+
+            # Record metrics and aggregate KPIs from the columnar store
+            store = MetricsStore(metrics_dir(cfg))
+            store.append(metric_rows)
+            stats = batch_kpis(store).get(batch_id) or empty_kpis()  # no topics -> no gate rows
+        finally:
+            if compactor is not None:
+                compactor.stop()
+
+        # Write summary
+        summary = {
+            "batch_id": batch_id,
+            "kpis": stats["kpis"],
+            "counts":{"topics":len(topics["topics"]),"turns_total":stats["counts"]["turns"],"accepted":stats["counts"]["accepted"],"rejected":stats["counts"]["rejected"]},
+            "artifacts":{"sft":str(sft_path),"dpo":str(dpo_path)},
+            "versions":{"encoder":ENCODER_NAME,"model":model_name},
+            "created_at": now_iso()
+        }
+        summary["storage"] = {
+            "compacted": compactor.compacted if compactor else [],
+            "errors": compactor.errors if compactor else [],
+            "throttled_s": round(sum(wm.throttled_s for wm in watermarks), 3),
+        }
+        write_json(runs_dir/"summary.json", summary)
     print(f"[dry-run] Wrote {sft_path} and {dpo_path}\nSummary: {runs_dir/'summary.json'}")
 
 if __name__ == "__main__":
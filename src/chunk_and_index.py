@@ -1,20 +1,217 @@
 """
 File: src/chunk_and_index.py
-Purpose: Build BM25 and FAISS indices from Latin corpora.
+Purpose: Build the dense embedding store (and index metadata) from Latin corpora.
 Inputs: --config path to YAML with paths.corpora and paths.indices
-Outputs: indices/bm25/*, indices/faiss/*, indices/meta.json
+Outputs: indices/dense/* (see src/vector_store.py), indices/meta.json
 Notes: In dry-run, this writes a meta.json only.
+
+Passages are sorted by length and cut into batches so each encoder call pads
+to similar lengths, then embedded by a process pool (one encoder per worker).
+Finished batches are appended in order to indices/dense.partial, so a crashed
+rebuild resumes where it stopped.  Once every passage is embedded the rows are
+reordered to corpus order and swapped into indices/dense, where
+debate_loop._prepare_retrieval maps it without re-encoding.  Debate workers
+that find the store missing or stale build it through build_dense_store too,
+so the fingerprint and row order are decided in one place.
+
+Passages already in the shared embedding cache (src/embedding_cache.py) are
+read from it instead of being sent to the pool; new vectors are added to it.
 """
-import argparse, json
+import argparse, os, shutil, time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from .config import load_config
+from .utils.lazy import lazy_import
 from .utils.logging import write_json, now_iso
-from .constants import ENCODER_NAME
+from .constants import ENCODER_NAME, RETRIEVAL_ENCODER
+from . import vector_store
+from .corpus import build_corpus, corpus_fingerprint
+from .embedding_cache import EmbeddingCache, cache_dir, prefixes, text_key
+
+np = lazy_import("numpy")
+sentence_transformers = lazy_import("sentence_transformers")
+torch = lazy_import("torch")
+
+_ENCODER = None  # per-process encoder, set by _init_worker
+
+# Each worker holds its own encoder: multilingual-e5-base is ~1.1 GB of fp32
+# weights, ~1.5 GB resident with activations for a 32-passage batch.
+WORKER_RAM_BYTES = int(1.5 * 1024**3)
+MAX_AUTO_WORKERS = 8
+
+
+def _available_ram() -> int:
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+def default_workers(cpu_count: int, available_ram: int, worker_ram: int = WORKER_RAM_BYTES) -> int:
+    """Worker count for ``workers=0``: a quarter of the cores, at most 8, bounded by free RAM.
+
+    Every worker costs another copy of the model, so fewer workers with at
+    least four intra-op threads each (``cpu_count // workers``) are preferred
+    over one single-threaded worker per core.
+    """
+
+    workers = min(max(1, cpu_count // 4), MAX_AUTO_WORKERS)
+    if available_ram > 0:
+        workers = min(workers, max(1, available_ram // worker_ram))
+    return workers
+
+
+def _load_encoder(name: str, revision: str = "main"):
+    return sentence_transformers.SentenceTransformer(name, revision=revision)
+
+
+def _set_encoder(model) -> None:
+    global _ENCODER
+    _ENCODER = model
+
+
+def _init_worker(name: str, threads: int, revision: str = "main"):
+    torch.set_num_threads(threads)
+    _set_encoder(_load_encoder(name, revision))
+
+
+def _embed_batch(texts):
+    return np.asarray(_ENCODER.encode(list(texts), show_progress_bar=False), dtype=np.float32)
+
+
+def _length_sorted_batches(docs, batch_size: int, skip: int = 0):
+    """Sort doc ids longest first; cut all but the first ``skip`` into batches.
+
+    Neighbouring passages in a batch have similar lengths, so the encoder pads
+    each batch to nearly the same size instead of to the longest passage.
+    """
+
+    order = sorted(range(len(docs)), key=lambda i: len(docs[i]), reverse=True)
+    rest = order[skip:]
+    return order, [rest[i : i + batch_size] for i in range(0, len(rest), batch_size)]
+
+
+def build_dense_store(docs, indices: Path, dtype: str = "float16", workers: int = 0, batch_size: int = 32,
+                      encoder_name: str = RETRIEVAL_ENCODER, encoder_revision: str = "main",
+                      cache: EmbeddingCache = None, store_name: str = "dense", load_model=None) -> dict:
+    """Embed ``docs`` into ``indices/<store_name>`` and return build statistics.
+
+    Holds the store's build lock throughout, so concurrent builds (or debate
+    workers finding the store stale) wait and then reuse the result.  With a
+    single worker, ``load_model`` (if given) supplies the in-process encoder
+    instead of loading another copy of ``encoder_name``.
+    """
+
+    with vector_store.build_lock(Path(indices) / store_name):
+        return _build_dense_store(
+            docs, Path(indices), dtype, workers, batch_size, encoder_name, encoder_revision, cache, store_name, load_model
+        )
+
+
+def _build_dense_store(docs, indices, dtype, workers, batch_size, encoder_name, encoder_revision, cache,
+                       store_name, load_model) -> dict:
+    final_dir = indices / store_name
+    partial_dir = indices / f"{store_name}.partial"
+    version = f"{encoder_name}@{encoder_revision}"
+    fingerprint = corpus_fingerprint(docs, version)
+    existing = vector_store.open_store(final_dir, fingerprint=fingerprint)
+    if existing is not None and existing.dtype == dtype:
+        return {"docs": len(docs), "embedded": 0, "cached": 0, "seconds": 0.0, "passages_per_sec": 0.0, "workers": 0}
+
+    if vector_store.exists(partial_dir):
+        staged = vector_store.EmbeddingStore(partial_dir)
+        if staged.meta.get("fingerprint") != fingerprint or staged.dtype != dtype:
+            shutil.rmtree(partial_dir)
+
+    writer = None
+    if vector_store.exists(partial_dir):
+        staged = vector_store.EmbeddingStore(partial_dir)
+        writer = vector_store.EmbeddingStoreWriter(partial_dir, staged.dim, dtype=dtype)
+    prefix = prefixes(encoder_name)[1]
+    texts = [prefix + d for d in docs]
+    order, batches = _length_sorted_batches(texts, batch_size, skip=writer.count if writer else 0)
+    todo = [[texts[i] for i in b] for b in batches]
+    # Only passages missing from the shared cache go to the encoder
+    if cache is not None:
+        cache.refresh()
+        keys = [[text_key(t) for t in batch] for batch in todo]
+        misses = [[t for t, r in zip(batch, cache.rows(k)) if r < 0] for batch, k in zip(todo, keys)]
+    else:
+        misses = todo
+    to_encode = [m for m in misses if m]
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or default_workers(cpus, _available_ram()), len(to_encode)))
+
+    start = time.perf_counter()
+    embedded = cached = 0
+    if not to_encode:
+        results, pool = iter(()), None
+    elif workers == 1:
+        if load_model is None:
+            _init_worker(encoder_name, torch.get_num_threads(), encoder_revision)
+        else:
+            _set_encoder(load_model())
+        results = map(_embed_batch, to_encode)
+        pool = None
+    else:
+        threads = max(1, cpus // workers)
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(encoder_name, threads, encoder_revision))
+        results = pool.map(_embed_batch, to_encode)
+    try:
+        for bi, batch in enumerate(todo):
+            emb = next(results) if misses[bi] else None
+            if cache is not None:
+                if emb is not None:
+                    cache.put_many([text_key(t) for t in misses[bi]], emb)
+                emb, _ = cache.get_many(keys[bi])
+                cached += len(batch) - len(misses[bi])
+            if writer is None:
+                writer = vector_store.EmbeddingStoreWriter(
+                    partial_dir, emb.shape[1], dtype=dtype, encoder=version, fingerprint=fingerprint
+                )
+            writer.append(emb)
+            embedded += len(misses[bi])
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    seconds = time.perf_counter() - start
+
+    if writer is not None:
+        _finalize(partial_dir, final_dir, order)
+    return {
+        "docs": len(docs),
+        "embedded": embedded,
+        "cached": cached,
+        "seconds": round(seconds, 3),
+        "passages_per_sec": embedded / seconds if seconds > 0 else 0.0,
+        "workers": workers,
+    }
+
+
+def _finalize(partial_dir: Path, final_dir: Path, order, block: int = 65536):
+    """Rewrite staged rows (length-sorted) into corpus order and swap them in."""
+
+    staged = vector_store.EmbeddingStore(partial_dir)
+    pos = np.empty(len(order), dtype=np.int64)
+    pos[np.asarray(order, dtype=np.int64)] = np.arange(len(order))
+
+    tmp_dir = final_dir.with_name(f"{final_dir.name}.tmp{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    meta = {k: v for k, v in staged.meta.items() if k not in ("dtype", "dim", "count")}
+    writer = vector_store.EmbeddingStoreWriter(tmp_dir, staged.dim, dtype=staged.dtype, **meta)
+    for s in range(0, len(pos), block):
+        idx = pos[s : s + block]
+        writer.append_raw(staged.rows[idx], staged.scales[idx] if staged.scales is not None else None)
+    vector_store.swap_in(tmp_dir, final_dir)
+    shutil.rmtree(partial_dir)
+
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--config", required=True)
     ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--workers", type=int, help="Embedding processes (default: retrieval.index_workers; 0 = sized from cores and free RAM)")
+    ap.add_argument("--batch-size", type=int, help="Passages per encoder call (default: retrieval.index_batch_size)")
     args = ap.parse_args()
 
     cfg = load_config(args.config)
@@ -27,6 +224,29 @@ def main():
         "bm25": "rank_bm25",
         "notes": "stub meta in dry-run",
     }
+    if not args.dry_run:
+        rcfg = cfg.get("retrieval", {})
+        dtype = rcfg.get("store", "float16")
+        if dtype == "faiss":
+            raise SystemExit("[chunk_and_index] retrieval.store is 'faiss'; nothing to build on disk")
+        docs = build_corpus(Path(cfg["paths"]["corpora"]))
+        revision = rcfg.get("encoder_revision", "main")
+        cache = EmbeddingCache(cache_dir(cfg), RETRIEVAL_ENCODER, revision) if rcfg.get("embedding_cache", True) else None
+        stats = build_dense_store(
+            docs,
+            indices,
+            dtype=dtype,
+            workers=args.workers if args.workers is not None else rcfg.get("index_workers", 0),
+            batch_size=args.batch_size or rcfg.get("index_batch_size", 32),
+            encoder_revision=revision,
+            cache=cache,
+        )
+        meta.update(encoder=f"{RETRIEVAL_ENCODER}@{revision}", store=dtype, dense=stats, notes="")
+        print(
+            f"[chunk_and_index] embedded {stats['embedded']}/{stats['docs']} passages "
+            f"({stats['cached']} from cache) with {stats['workers']} workers "
+            f"({stats['passages_per_sec']:.1f} passages/s)"
+        )
     write_json(indices/"meta.json", meta)
     print(f"[chunk_and_index] wrote {indices/'meta.json'}")
 
@@ -3,3 +3,6 @@ Shared constants for the philosopher-theologian dataset factory.
 """
 
 ENCODER_NAME = "intfloat/multilingual-e5-base"
+
+# Dense retrieval encoder, shared by index builds and debate/audit workers
+RETRIEVAL_ENCODER = ENCODER_NAME
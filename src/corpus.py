@@ -0,0 +1,36 @@
+"""src.corpus
+============
+
+The retrieval corpus: one document per ``*.txt`` file under
+``paths.corpora``, in sorted file order.  Row ``i`` of a dense store is the
+embedding of document ``i``.  :func:`corpus_fingerprint` ties a store to the
+exact documents and encoder it was built from.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+from typing import List, Sequence
+
+
+def build_corpus(corpora_dir: Path) -> List[str]:
+    """Return list of documents (one per text file)."""
+
+    docs = []
+    corpora_dir = Path(corpora_dir)
+    if not corpora_dir.exists():
+        return docs
+    for p in sorted(corpora_dir.glob("*.txt")):
+        with open(p, "r", encoding="utf-8") as f:
+            docs.append(f.read())
+    return docs
+
+
+def corpus_fingerprint(docs: Sequence[str], encoder_version: str) -> str:
+    """Hash of the encoder version (``name@revision``) and every document, in order."""
+
+    h = hashlib.sha1(encoder_version.encode("utf-8"))
+    for d in docs:
+        h.update(hashlib.sha1(d.encode("utf-8")).digest())
+    return h.hexdigest()
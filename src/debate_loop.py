@@ -16,24 +16,32 @@ elaborate indices without changing the public API.
 from __future__ import annotations
 
 import argparse
+import re
+import time
 import uuid
 from pathlib import Path
-from typing import Dict, List, Sequence
+from typing import Dict, List, Optional, Sequence
 
-import faiss
-import numpy as np
 import yaml
-from rank_bm25 import BM25Okapi
-from sentence_transformers import SentenceTransformer
-from transformers import (
-    AutoModelForCausalLM,
-    AutoTokenizer,
-    set_seed,
-)
 
+from . import chunk_and_index, vector_store
 from .config import load_config
+from .constants import RETRIEVAL_ENCODER
+from .corpus import build_corpus, corpus_fingerprint
+from .embedding_cache import CachedEncoder, cached_encoder
+from .metrics_store import MetricsStore, metrics_dir, new_run_id
+from .rerank import make_reranker
+from .utils.lazy import lazy_import
 from .utils.logging import now_iso, write_json
 
+# Heavy ML dependencies are resolved on first use so that ``--help`` and
+# callers that only need the lightweight helpers do not import torch.
+faiss = lazy_import("faiss")
+np = lazy_import("numpy")
+rank_bm25 = lazy_import("rank_bm25")
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
+
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -78,83 +86,378 @@ def _load_personas(paths: Sequence[str]) -> List[Dict]:
     return personas
 
 
-def _build_corpus(corpora_dir: Path) -> List[str]:
-    """Return list of documents (one per text file)."""
-
-    docs = []
-    if not corpora_dir.exists():
-        return docs
-    for p in sorted(corpora_dir.glob("*.txt")):
-        with open(p, "r", encoding="utf-8") as f:
-            docs.append(f.read())
-    return docs
+def _prepare_retrieval(
+    corpora_dir: Path, store_dir: Optional[Path] = None, store_dtype: str = "float16",
+    encoder: Optional[CachedEncoder] = None, workers: int = 1,
+):
+    """Create BM25 and dense indices from corpora.
 
+    Without ``store_dir`` the dense side is an in-process float32 FAISS index.
+    With ``store_dir`` the embeddings live in a memory-mapped
+    :mod:`src.vector_store` that is built once and then mapped by every worker
+    process, so additional workers add almost no resident memory.  A missing
+    or stale store is built by :func:`src.chunk_and_index.build_dense_store`
+    (``workers`` embedding processes; ``1`` reuses ``encoder``'s model).
 
-def _prepare_retrieval(corpora_dir: Path):
-    """Create BM25 and FAISS indices from corpora."""
+    ``encoder`` defaults to an uncached :data:`RETRIEVAL_ENCODER`; pass one
+    from :func:`src.embedding_cache.cached_encoder` to share vectors with
+    other stages.
+    """
 
-    docs = _build_corpus(corpora_dir)
-    bm25 = BM25Okapi([d.split() for d in docs]) if docs else None
+    docs = build_corpus(corpora_dir)
+    bm25 = rank_bm25.BM25Okapi([d.split() for d in docs]) if docs else None
 
-    if docs:
-        encoder = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-        embeddings = encoder.encode(docs, show_progress_bar=False)
-        faiss.normalize_L2(embeddings)
-        f_index = faiss.IndexFlatIP(embeddings.shape[1])
-        f_index.add(embeddings)
-    else:
-        encoder = None
-        f_index = None
+    if not docs:
+        return docs, bm25, None, None
+
+    encoder = encoder or CachedEncoder(RETRIEVAL_ENCODER)
+    if store_dir is not None:
+        store_dir = Path(store_dir)
+        fingerprint = corpus_fingerprint(docs, encoder.version)
+        f_index = vector_store.open_store(store_dir, fingerprint=fingerprint)
+        if f_index is None or f_index.dtype != store_dtype:
+            # Holds the build lock: workers starting together build once, the rest map the result
+            chunk_and_index.build_dense_store(
+                docs, store_dir.parent, dtype=store_dtype, workers=workers, batch_size=encoder.batch_size,
+                encoder_name=encoder.name, encoder_revision=encoder.revision, cache=encoder.cache,
+                store_name=store_dir.name, load_model=lambda: encoder.model,
+            )
+            f_index = vector_store.EmbeddingStore(store_dir)
+        return docs, bm25, encoder, f_index
+
+    embeddings = encoder.encode([encoder.passage_prefix + d for d in docs], show_progress_bar=False)
+    faiss.normalize_L2(embeddings)
+    f_index = faiss.IndexFlatIP(embeddings.shape[1])
+    f_index.add(embeddings)
     return docs, bm25, encoder, f_index
 
 
-def _hybrid_search(query: str, docs, bm25, encoder, f_index, k=6):
-    """Return top-k context snippets using BM25 and FAISS fused via RRF."""
+def _hybrid_search_batch(
+    queries: Sequence[str], docs, bm25, encoder, f_index, k=6, bm25_k=None, dense_k=None, reranker=None
+) -> List[List[Dict]]:
+    """Run :func:`_hybrid_search` for several queries with one encoder call.
+
+    Queries are embedded and searched as one matrix; with a reranker all
+    candidate pools are rescored together via ``rerank_many``.
+    """
 
     if not docs:
-        return []
+        return [[] for _ in queries]
+
+    if isinstance(encoder, CachedEncoder):
+        q_emb = encoder.encode_queries(queries)  # history-built, never repeated: not cached
+    else:
+        q_emb = encoder.encode(list(queries), show_progress_bar=False)
+    if isinstance(f_index, vector_store.EmbeddingStore):
+        q_emb = vector_store._normalize(q_emb)  # memory-mapped store: no faiss needed
+    else:
+        faiss.normalize_L2(q_emb)
+    dense_scores, dense_ids = f_index.search(q_emb, dense_k or k)
+
+    pools = []
+    for qi, query in enumerate(queries):
+        bm_scores = bm25.get_scores(query.split())
+        bm_order = np.argsort(bm_scores)[::-1][: bm25_k or k]
+        dense_order = dense_ids[qi]
+
+        scores = {}
+        for rank, idx in enumerate(bm_order, start=1):
+            scores[idx] = scores.get(idx, 0.0) + 1.0 / (60 + rank)
+        for rank, idx in enumerate(dense_order, start=1):
+            if idx < 0:  # fewer docs than k
+                continue
+            scores[idx] = scores.get(idx, 0.0) + 1.0 / (60 + rank)
+
+        fused = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        if reranker is None:
+            fused = fused[:k]
+        pools.append([{"source": f"doc_{i}", "text": docs[i], "score": s} for i, s in fused])
+
+    return reranker.rerank_many(list(queries), pools, k) if reranker is not None else pools
+
+
+def _hybrid_search(query: str, docs, bm25, encoder, f_index, k=6, bm25_k=None, dense_k=None, reranker=None):
+    """Return top-k context snippets using BM25 and FAISS fused via RRF.
+
+    ``bm25_k``/``dense_k`` size the candidate pool taken from each retriever
+    (default ``k``).  With a :class:`src.rerank.CrossEncoderReranker` the fused
+    pool is rescored by the cross-encoder before the top ``k`` are kept.
+    """
+
+    return _hybrid_search_batch([query], docs, bm25, encoder, f_index, k, bm25_k, dense_k, reranker)[0]
 
-    q_tokens = query.split()
-    bm_scores = bm25.get_scores(q_tokens)
-    bm_order = np.argsort(bm_scores)[::-1][:k]
 
-    q_emb = encoder.encode([query], show_progress_bar=False)
-    faiss.normalize_L2(q_emb)
-    dense_scores, dense_ids = f_index.search(q_emb, k)
-    dense_order = dense_ids[0]
+def _load_retrieval(cfg: Dict):
+    """Build the in-process retrieval stack described by ``cfg``.
 
-    scores = {}
-    for rank, idx in enumerate(bm_order, start=1):
-        scores[idx] = scores.get(idx, 0.0) + 1.0 / (60 + rank)
-    for rank, idx in enumerate(dense_order, start=1):
-        scores[idx] = scores.get(idx, 0.0) + 1.0 / (60 + rank)
+    Returns ``(search_batch, reranker)`` where ``search_batch(queries, k)``
+    wraps :func:`_hybrid_search_batch` with the loaded indices.
+    """
+
+    corpora_dir = Path(cfg["paths"]["corpora"])
+    store_dtype = cfg.get("retrieval", {}).get("store", "faiss")
+    store_dir = Path(cfg["paths"]["indices"]) / "dense" if store_dtype != "faiss" else None
+    workers = cfg.get("retrieval", {}).get("index_workers", 0)
+    docs, bm25, encoder, f_index = _prepare_retrieval(corpora_dir, store_dir, store_dtype, cached_encoder(cfg), workers)
+    reranker = make_reranker(cfg)
+    pool = {"bm25_k": cfg["auditor"]["bm25_k"], "dense_k": cfg["auditor"]["dense_k"]} if reranker else {}
+
+    def search_batch(queries: Sequence[str], k: int = 6) -> List[List[Dict]]:
+        return _hybrid_search_batch(queries, docs, bm25, encoder, f_index, k=k, reranker=reranker, **pool)
+
+    return search_batch, reranker
+
+
+def _make_searcher(cfg: Dict):
+    """Return ``(search, reranker)`` for ``retrieval.mode`` ``local`` or ``service``.
+
+    ``search(query, k)`` returns the context snippets.  In service mode the
+    indices live in :mod:`src.retrieval_service` and no reranker is local.
+    """
+
+    if cfg.get("retrieval", {}).get("mode", "local") == "service":
+        from .retrieval_service import RetrievalClient
 
-    top = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
-    return [
-        {"source": f"doc_{i}", "text": docs[i], "score": s} for i, s in top
-    ]
+        client = RetrievalClient.from_config(cfg)
+        return client.search, None
+    search_batch, reranker = _load_retrieval(cfg)
+    return (lambda query, k=6: search_batch([query], k)[0]), reranker
+
+
+# personas.load.dtype -> torch dtype attribute
+_TORCH_DTYPES = {"fp32": "float32", "fp16": "float16", "bf16": "bfloat16"}
+
+
+def _resolve_load_options(load_cfg: Optional[Dict], cuda_available: bool) -> Dict:
+    """Map ``personas.load`` onto concrete loader settings for this machine.
+
+    ``quant_4bit``/``quant_int8`` use bitsandbytes on CUDA.  bitsandbytes has
+    no CPU kernels, so on CPU either flag selects dynamic int8 quantization of
+    the ``nn.Linear`` layers, which runs on fp32 weights.  fp16 matmuls are slow
+    or missing on CPU, so fp16 is loaded as bf16 there.
+    """
+
+    load_cfg = load_cfg or {}
+    device = load_cfg.get("device", "auto")
+    if device == "auto":
+        device = "cuda" if cuda_available else "cpu"
+    dtype = load_cfg.get("dtype", "fp32")
+    if dtype not in _TORCH_DTYPES:
+        raise ValueError(f"personas.load.dtype must be one of {sorted(_TORCH_DTYPES)}, got {dtype!r}")
+
+    quant = None
+    if device == "cpu":
+        if load_cfg.get("quant_int8") or load_cfg.get("quant_4bit"):
+            quant, dtype = "int8_dynamic", "fp32"
+        elif dtype == "fp16":
+            dtype = "bf16"
+    elif load_cfg.get("quant_4bit"):
+        quant = "4bit"
+    elif load_cfg.get("quant_int8"):
+        quant = "8bit"
+    return {
+        "device": device,
+        "dtype": dtype,
+        "quant": quant,
+        "threads": int(load_cfg.get("threads") or 0),
+        "mode": f"{device}-{quant or dtype}",
+    }
+
+
+def _rss_mb() -> float:
+    """Resident set size of this process in MiB."""
+
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
 
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, KiB on Linux
 
-def _load_model(model_name: str):
-    """Load a causal LM, falling back to a tiny model if necessary."""
 
+def _load_model(model_name: str, load_cfg: Optional[Dict] = None):
+    """Load a causal LM per ``personas.load``, falling back to a tiny model if necessary.
+
+    Returns ``(tokenizer, model, used_name, report)`` where ``report`` holds
+    the resolved options plus ``load_s``, ``rss_mb`` and the number of linear
+    layers quantized.
+    """
+
+    opts = _resolve_load_options(load_cfg, torch.cuda.is_available())
+    if opts["threads"]:
+        torch.set_num_threads(opts["threads"])
+    kwargs = {"torch_dtype": getattr(torch, _TORCH_DTYPES[opts["dtype"]])}
+    if opts["quant"] == "4bit":
+        kwargs["quantization_config"] = transformers.BitsAndBytesConfig(
+            load_in_4bit=True, bnb_4bit_compute_dtype=kwargs["torch_dtype"]
+        )
+    elif opts["quant"] == "8bit":
+        kwargs["quantization_config"] = transformers.BitsAndBytesConfig(load_in_8bit=True)
+    if opts["device"] == "cuda":
+        kwargs["device_map"] = "auto"
+
+    start = time.perf_counter()
     fallback = "sshleifer/tiny-gpt2"
     used = model_name
     try:
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForCausalLM.from_pretrained(model_name)
+        tokenizer = transformers.AutoTokenizer.from_pretrained(model_name)
+        model = transformers.AutoModelForCausalLM.from_pretrained(model_name, **kwargs)
     except (OSError, ValueError):
-        tokenizer = AutoTokenizer.from_pretrained(fallback)
-        model = AutoModelForCausalLM.from_pretrained(fallback)
+        tokenizer = transformers.AutoTokenizer.from_pretrained(fallback)
+        model = transformers.AutoModelForCausalLM.from_pretrained(fallback, **kwargs)
         used = fallback
     model.eval()
-    return tokenizer, model, used
+
+    quantized = 0
+    if opts["quant"] == "int8_dynamic":
+        # GPT-2 style models use Conv1D rather than nn.Linear and stay fp32
+        quantized = sum(isinstance(m, torch.nn.Linear) for m in model.modules())
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    report = dict(
+        opts,
+        model=used,
+        load_s=round(time.perf_counter() - start, 3),
+        rss_mb=round(_rss_mb(), 1),
+        quantized_linear=quantized,
+    )
+    return tokenizer, model, used, report
+
+
+_SENTENCE_END = re.compile(r"[.!?][\"'»”)\]]*\s*$")
+_WORD = re.compile(r"\S+")
+
+
+def _word_count(text: str) -> int:
+    return len(text.split())
 
 
-def _generate(model, tokenizer, prompt: str, max_new_tokens=256) -> str:
-    import torch
+def _citation_complete(text: str) -> bool:
+    """True when no ``(...)`` or ``[...]`` citation is left open."""
 
-    inputs = tokenizer(prompt, return_tensors="pt")
+    return text.count("(") <= text.count(")") and text.count("[") <= text.count("]")
+
+
+def _budget_reached(text: str, min_words: int, max_words: int) -> bool:
+    """Whether decoding can stop: ceiling passed, or a clean sentence end past the floor.
+
+    The ceiling fires only once a word *beyond* ``max_words`` has started, so
+    the first ``max_words`` words are complete (a subword decode may still be
+    inside the last one) and :func:`_trim_to_words` can cut back to them.
+    """
+
+    n = _word_count(text)
+    if n > max_words:
+        return True
+    return n >= min_words and _citation_complete(text) and bool(_SENTENCE_END.search(text))
+
+
+def _trim_to_words(text: str, max_words: int, min_words: int = 0) -> str:
+    """Cut ``text`` to ``max_words``, preferring the last complete sentence.
+
+    The cut is made in the original string, so line and paragraph breaks
+    inside the kept text survive.
+    """
+
+    ends = [m.end() for m in _WORD.finditer(text)]
+    if len(ends) <= max_words:
+        return text.strip()
+    for end in range(max_words, max(min_words, 1) - 1, -1):
+        candidate = text[: ends[end - 1]].strip()
+        if _SENTENCE_END.search(candidate) and _citation_complete(candidate):
+            return candidate
+    return text[: ends[max_words - 1]].strip()
+
+
+class WordBudgetStoppingCriteria:
+    """Per-sequence stopping on the persona word budget.
+
+    Used inside a ``transformers.StoppingCriteriaList``.  Returns one flag per
+    row so that, in batched generation, finished sequences stop consuming
+    decode steps while the others continue.  ``stop_steps[i]`` records the
+    number of new tokens row ``i`` had when it was stopped.
+    """
+
+    def __init__(self, tokenizer, prompt_len: int, min_words: int, max_words: int):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+        self.min_words = min_words
+        self.max_words = max_words
+        self.done: List[bool] = []
+        self.stop_steps: List[Optional[int]] = []
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if not self.done:
+            self.done = [False] * len(input_ids)
+            self.stop_steps = [None] * len(input_ids)
+        step = input_ids.shape[1] - self.prompt_len
+        for i, row in enumerate(input_ids):
+            if self.done[i]:
+                continue
+            text = self.tokenizer.decode(row[self.prompt_len :], skip_special_tokens=True)
+            if _budget_reached(text, self.min_words, self.max_words):
+                self.done[i] = True
+                self.stop_steps[i] = step
+        return torch.tensor(self.done, dtype=torch.bool, device=getattr(input_ids, "device", None))
+
+
+def _account_turn(raw: str, new_tokens: int, count_tokens, min_words: int, max_words: int) -> Dict:
+    """Trim a decoded turn and classify it against the gate's length/sentence rules.
+
+    ``outcome`` is ``ok``, ``short`` (ended, e.g. on EOS, below ``min_words``)
+    or ``no_sentence_end`` (hit the ceiling with no clean sentence end in
+    range).  ``wasted_tokens`` counts every decoded token of turns that are
+    not ``ok``, since the gate rejects them; ``trimmed_tokens`` counts tokens
+    decoded past the kept text.
+    """
+
+    text = _trim_to_words(raw, max_words, min_words)
+    kept = count_tokens(text) if text != raw.strip() else new_tokens
+    kept = min(kept, new_tokens)
+    words = _word_count(text)
+    if words < min_words:
+        outcome = "short"
+    elif not (_SENTENCE_END.search(text) and _citation_complete(text)):
+        outcome = "no_sentence_end"
+    else:
+        outcome = "ok"
+    return {
+        "text": text,
+        "words": words,
+        "new_tokens": new_tokens,
+        "kept_tokens": kept,
+        "trimmed_tokens": new_tokens - kept,
+        "wasted_tokens": 0 if outcome == "ok" else new_tokens,
+        "outcome": outcome,
+    }
+
+
+def _generate_batch(
+    model,
+    tokenizer,
+    prompts: Sequence[str],
+    min_words: int = 120,
+    max_words: int = 180,
+    max_new_tokens: int = 256,
+) -> List[Dict]:
+    """Generate one response per prompt within the word budget.
+
+    Each result holds the trimmed ``text`` plus the decode accounting of
+    :func:`_account_turn` and ``stopped_early``.
+    """
+
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+    inputs = tokenizer(list(prompts), return_tensors="pt", padding=True)
+    device = getattr(model, "device", None)
+    if device is not None:
+        inputs = inputs.to(device)
+    prompt_len = inputs["input_ids"].shape[1]
+    budget = WordBudgetStoppingCriteria(tokenizer, prompt_len, min_words, max_words)
     with torch.no_grad():
         output = model.generate(
             **inputs,
@@ -162,9 +465,26 @@ def _generate(model, tokenizer, prompt: str, max_new_tokens=256) -> str:
             temperature=0.7,
             top_p=0.9,
             max_new_tokens=max_new_tokens,
+            pad_token_id=tokenizer.pad_token_id,
+            stopping_criteria=transformers.StoppingCriteriaList([budget]),
         )
-    text = tokenizer.decode(output[0][inputs["input_ids"].shape[1] :], skip_special_tokens=True)
-    return text.strip()
+
+    def count_tokens(text: str) -> int:
+        return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    results = []
+    for i, row in enumerate(output):
+        new_ids = row[prompt_len:]
+        new_tokens = int((new_ids != tokenizer.pad_token_id).sum())
+        raw = tokenizer.decode(new_ids, skip_special_tokens=True)
+        turn = _account_turn(raw, new_tokens, count_tokens, min_words, max_words)
+        turn["stopped_early"] = bool(budget.stop_steps) and budget.stop_steps[i] is not None
+        results.append(turn)
+    return results
+
+
+def _generate(model, tokenizer, prompt: str, max_new_tokens=256, min_words=120, max_words=180) -> str:
+    return _generate_batch(model, tokenizer, [prompt], min_words, max_words, max_new_tokens)[0]["text"]
 
 
 # ---------------------------------------------------------------------------
@@ -181,14 +501,18 @@ def main():
     cfg = load_config(args.config)
     topics_yaml = _load_yaml(args.topics)
     personas = _load_personas(args.personas)
+    personas_by_name = {p["name"]: p for p in personas}
 
-    # prepare retrieval
-    corpora_dir = Path(cfg["paths"]["corpora"])
-    docs, bm25, encoder, f_index = _prepare_retrieval(corpora_dir)
+    # prepare retrieval (in-process or via the shared retrieval service)
+    search, reranker = _make_searcher(cfg)
 
     # load model
     model_name = cfg["personas"].get("model", "sshleifer/tiny-gpt2")
-    tokenizer, model, model_name = _load_model(model_name)
+    tokenizer, model, model_name, load_report = _load_model(model_name, cfg["personas"].get("load"))
+    print(
+        f"[debate_loop] loaded {model_name} as {load_report['mode']} in {load_report['load_s']:.1f}s, "
+        f"RSS {load_report['rss_mb']:.0f} MB"
+    )
 
     # run conversation
     batch_id = cfg["batch_id"]
@@ -196,9 +520,16 @@ def main():
     out_dir.mkdir(parents=True, exist_ok=True)
 
     persona_order = topics_yaml.get("persona_order") or cfg["personas"]["order"]
-    set_seed(cfg.get("seed", 0))
+    transformers.set_seed(cfg.get("seed", 0))
 
     max_turns = topics_yaml.get("turns", len(persona_order))
+    gen_cfg = cfg["generator"]
+    min_words, max_words = gen_cfg["min_words"], gen_cfg["max_words"]
+    max_new_tokens = gen_cfg.get("max_new_tokens", 256)
+    decoded_total = wasted_total = trimmed_total = 0
+    gen_seconds = 0.0
+    run_id = new_run_id("debate")
+    metric_rows = []
 
     for topic in topics_yaml["topics"]:
         history: List[str] = []
@@ -206,12 +537,19 @@ def main():
             persona = personas_by_name[persona_order[i % len(persona_order)]]
             # retrieval
             query = topic + " " + " ".join(history)
-            ctx = _hybrid_search(query, docs, bm25, encoder, f_index, k=6)
+            ctx = search(query, k=6)
 
             context_text = "\n".join(c["text"] for c in ctx)
             prompt = f"{persona['prompt']}\n\nTopic: {topic}\n\nContext:\n{context_text}\n\nResponse:"  # simple template
-            response = _generate(model, tokenizer, prompt, max_new_tokens=256)
+            start = time.perf_counter()
+            gen = _generate_batch(model, tokenizer, [prompt], min_words, max_words, max_new_tokens)[0]
+            gen_ms = (time.perf_counter() - start) * 1000
+            gen_seconds += gen_ms / 1000
+            response = gen["text"]
             history.append(response)
+            decoded_total += gen["new_tokens"]
+            wasted_total += gen["wasted_tokens"]
+            trimmed_total += gen["trimmed_tokens"]
 
             turn_id = f"{batch_id}.{uuid.uuid4().hex[:8]}"
             item = {
@@ -224,10 +562,41 @@ def main():
                     "batch_id": batch_id,
                     "created_at": now_iso(),
                     "model": model_name,
+                    "load_mode": load_report["mode"],
                     "sampler": {"temperature": 0.7, "top_p": 0.9},
+                    "decode": {
+                        k: gen[k]
+                        for k in ("words", "new_tokens", "kept_tokens", "trimmed_tokens", "wasted_tokens", "outcome")
+                    },
                 },
             }
             write_json(out_dir / f"{turn_id}.json", item)
+            metric_rows.append(
+                {
+                    "batch_id": batch_id,
+                    "run": run_id,
+                    "stage": "debate",
+                    "speaker": persona["name"],
+                    "topic": topic,
+                    "words": gen["words"],
+                    "citations": len(ctx),
+                    "gen_ms": gen_ms,
+                }
+            )
+
+    MetricsStore(metrics_dir(cfg)).append(metric_rows)
+    print(
+        f"[debate_loop] decoded {decoded_total} tokens "
+        f"({decoded_total / gen_seconds if gen_seconds else 0.0:.1f} tokens/s, {load_report['mode']}); "
+        f"{wasted_total} wasted on turns outside the length/sentence rules, "
+        f"{trimmed_total} trimmed past the ceiling"
+    )
+    if reranker is not None:
+        st = reranker.stats
+        print(
+            f"[debate_loop] rerank: {reranker.latency_ms():.1f} ms/query added, "
+            f"{st['cache_hits']}/{st['pairs']} pairs from cache"
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,278 @@
+"""src.embedding_cache
+====================
+
+Persistent, content-addressed text-embedding cache shared by every stage.
+
+Entries are keyed by ``(encoder name, revision, sha1(text))``.  Each
+encoder/revision pair has its own directory, so switching encoders (or
+pinning a new revision) simply starts a fresh directory and never touches
+the entries of any other encoder::
+
+    indices/embedding_cache/<encoder>@<revision>/
+        meta.json      # {"encoder", "revision", "dim", "count"}
+        keys.bin       # count x 20-byte sha1 digests, row order
+        vectors.bin    # count x dim float16, row order
+
+Lookups map ``vectors.bin`` with :class:`numpy.memmap` and binary-search a
+sorted copy of ``keys.bin``.  Rows appended later (by this or another
+process) are read from the tail of ``keys.bin`` into a dict, which is folded
+into the sorted copy once it outgrows a quarter of it.  Appends take an
+exclusive ``fcntl`` lock (as in :mod:`src.metrics_store`), so index builds,
+debate workers and the retrieval service can share one cache.  ``meta.json`` is replaced after both files are
+written; torn tails from a crashed writer are truncated on the next append.
+
+:class:`CachedEncoder` puts the cache in front of a sentence-transformers
+model.  The model is only loaded on the first miss.  Vectors are rounded to
+float16 whether they are fresh or cached, so results never depend on cache
+state.  Retrieval queries are one-off strings (topic plus debate history),
+so :meth:`CachedEncoder.encode_queries` bypasses the cache.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .constants import ENCODER_NAME
+from .utils.lazy import lazy_import
+
+np = lazy_import("numpy")
+sentence_transformers = lazy_import("sentence_transformers")
+
+KEY_BYTES = 20
+META_FILE = "meta.json"
+KEYS_FILE = "keys.bin"
+VECTORS_FILE = "vectors.bin"
+LOCK_FILE = ".lock"
+MERGE_MIN_ROWS = 4096
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+def prefixes(encoder_name: str) -> Tuple[str, str]:
+    """``(query, passage)`` prefixes the encoder was trained with (E5 family)."""
+
+    if "e5-" in encoder_name.lower():
+        return "query: ", "passage: "
+    return "", ""
+
+
+def cache_dir(cfg: Dict) -> Path:
+    return Path(cfg["paths"]["indices"]) / "embedding_cache"
+
+
+class EmbeddingCache:
+    """Memory-mapped ``text hash -> vector`` table for one encoder revision."""
+
+    def __init__(self, root: Path, encoder_name: str, revision: str = "main"):
+        self.encoder_name = encoder_name
+        self.revision = revision
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "__", f"{encoder_name}@{revision}")
+        self.path = Path(root) / slug
+        self.stats = {"hits": 0, "misses": 0, "added": 0}
+        self._load()
+
+    # -- files --------------------------------------------------------------
+
+    def _read_meta(self) -> Dict:
+        p = self.path / META_FILE
+        if not p.exists():
+            return {"encoder": self.encoder_name, "revision": self.revision, "dim": None, "count": 0}
+        with open(p, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _load(self) -> None:
+        meta = self._read_meta()
+        self.dim: Optional[int] = meta["dim"]
+        self._count = meta["count"]
+        self._recent: Dict[bytes, int] = {}
+        if self._count == 0:
+            self._sorted_keys = self._order = self._vectors = None
+            return
+        keys = np.fromfile(self.path / KEYS_FILE, dtype=f"S{KEY_BYTES}", count=self._count)
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+        self._map_vectors()
+
+    def _catch_up(self, meta: Dict) -> None:
+        """Index the rows appended to ``keys.bin`` since ``self._count``."""
+
+        count = meta["count"]
+        if count <= self._count:
+            return
+        with open(self.path / KEYS_FILE, "rb") as f:
+            f.seek(self._count * KEY_BYTES)
+            tail = f.read((count - self._count) * KEY_BYTES)
+        for i in range(count - self._count):
+            self._recent[tail[i * KEY_BYTES : (i + 1) * KEY_BYTES]] = self._count + i
+        self.dim, self._count = meta["dim"], count
+        sorted_rows = 0 if self._sorted_keys is None else len(self._sorted_keys)
+        if len(self._recent) > max(MERGE_MIN_ROWS, sorted_rows // 4):
+            self._merge_recent()
+        self._map_vectors()
+
+    def _merge_recent(self) -> None:
+        keys = np.array(list(self._recent), dtype=f"S{KEY_BYTES}")
+        order = np.fromiter(self._recent.values(), dtype=np.int64, count=len(self._recent))
+        if self._sorted_keys is not None:
+            keys = np.concatenate([self._sorted_keys, keys])
+            order = np.concatenate([self._order, order])
+        idx = np.argsort(keys, kind="stable")
+        self._sorted_keys, self._order = keys[idx], order[idx]
+        self._recent = {}
+
+    def _map_vectors(self) -> None:
+        self._vectors = np.memmap(
+            self.path / VECTORS_FILE, dtype=np.float16, mode="r", shape=(self._count, self.dim)
+        )
+
+    @contextmanager
+    def _locked(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / LOCK_FILE, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # -- api ----------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self._count
+
+    def refresh(self) -> None:
+        """Pick up rows appended by other processes since this cache was opened."""
+
+        self._catch_up(self._read_meta())
+
+    def rows(self, keys: Sequence[bytes]):
+        """Row number of each key, ``-1`` for misses."""
+
+        out = np.full(len(keys), -1, dtype=np.int64)
+        if self._sorted_keys is not None and len(keys):
+            q = np.array(keys, dtype=f"S{KEY_BYTES}")
+            pos = np.minimum(np.searchsorted(self._sorted_keys, q), len(self._sorted_keys) - 1)
+            found = self._sorted_keys[pos] == q
+            out[found] = self._order[pos[found]]
+        for i in np.flatnonzero(out < 0):
+            out[i] = self._recent.get(keys[i], -1)
+        return out
+
+    def get_many(self, keys: Sequence[bytes]):
+        """Return ``(vectors, rows)``; missing rows are zero and ``rows == -1``."""
+
+        rows = self.rows(keys)
+        if (rows < 0).any():
+            self.refresh()
+            rows = self.rows(keys)
+        hit = rows >= 0
+        self.stats["hits"] += int(hit.sum())
+        self.stats["misses"] += int(len(keys) - hit.sum())
+        vectors = np.zeros((len(keys), self.dim or 0), dtype=np.float32)
+        if hit.any():
+            vectors[hit] = self._vectors[rows[hit]]
+        return vectors, rows
+
+    def put_many(self, keys: Sequence[bytes], vectors) -> None:
+        vectors = np.asarray(vectors, dtype=np.float16)
+        if len(keys) != len(vectors):
+            raise ValueError(f"{len(keys)} keys for {len(vectors)} vectors")
+        if not len(keys):
+            return
+        with self._locked():
+            meta = self._read_meta()
+            if meta["dim"] is not None and meta["dim"] != vectors.shape[1]:
+                raise ValueError(
+                    f"{self.path} holds {meta['dim']}-d vectors, got {vectors.shape[1]}-d from {self.encoder_name}"
+                )
+            count = meta["count"]
+            for name, size in ((KEYS_FILE, KEY_BYTES), (VECTORS_FILE, 2 * vectors.shape[1])):
+                p = self.path / name
+                if p.exists() and p.stat().st_size > count * size:
+                    os.truncate(p, count * size)
+            with open(self.path / KEYS_FILE, "ab") as f:
+                f.write(b"".join(keys))
+            with open(self.path / VECTORS_FILE, "ab") as f:
+                vectors.tofile(f)
+            meta.update(dim=int(vectors.shape[1]), count=count + len(keys))
+            tmp = self.path / (META_FILE + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, self.path / META_FILE)
+
+        self._catch_up(meta)  # also picks up rows other processes appended meanwhile
+        self.stats["added"] += len(keys)
+
+
+class CachedEncoder:
+    """``encode()`` front for a sentence-transformers model, backed by the cache.
+
+    ``query_prefix``/``passage_prefix`` hold the prefixes the encoder expects;
+    callers prepend them so the cache key is the exact string encoded.
+    """
+
+    def __init__(self, name: str = ENCODER_NAME, revision: str = "main", cache: Optional[EmbeddingCache] = None,
+                 load: Optional[Callable[[], object]] = None, batch_size: int = 32):
+        self.name = name
+        self.revision = revision
+        self.cache = cache
+        self.batch_size = batch_size
+        self.query_prefix, self.passage_prefix = prefixes(name)
+        self._load = load or (lambda: sentence_transformers.SentenceTransformer(name, revision=revision))
+        self._model = None
+
+    @property
+    def version(self) -> str:
+        return f"{self.name}@{self.revision}"
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self._load()
+        return self._model
+
+    def _encode(self, texts: List[str]):
+        emb = self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=False)
+        return np.asarray(emb, dtype=np.float16).astype(np.float32)
+
+    def encode_queries(self, queries: Sequence[str]):
+        """Encode retrieval queries with ``query_prefix``, bypassing the cache."""
+
+        return self._encode([self.query_prefix + q for q in queries])
+
+    def encode(self, texts: Sequence[str], show_progress_bar: bool = False):
+        texts = list(texts)
+        if self.cache is None:
+            return self._encode(texts)
+        keys = [text_key(t) for t in texts]
+        vectors, rows = self.cache.get_many(keys)
+        missing = np.flatnonzero(rows < 0)
+        if len(missing) == 0:
+            return vectors
+        todo = list(dict.fromkeys(texts[i] for i in missing))
+        fresh = self._encode(todo)
+        self.cache.put_many([text_key(t) for t in todo], fresh)
+        if vectors.shape[1] != fresh.shape[1]:
+            vectors = np.zeros((len(texts), fresh.shape[1]), dtype=np.float32)
+            missing = np.arange(len(texts))
+        at = {t: i for i, t in enumerate(todo)}
+        vectors[missing] = fresh[[at[texts[i]] for i in missing]]
+        return vectors
+
+
+def cached_encoder(cfg: Dict, name: str = ENCODER_NAME) -> CachedEncoder:
+    """Encoder configured by ``retrieval.encoder_revision``/``retrieval.embedding_cache``."""
+
+    rcfg = cfg.get("retrieval", {})
+    revision = rcfg.get("encoder_revision", "main")
+    cache = EmbeddingCache(cache_dir(cfg), name, revision) if rcfg.get("embedding_cache", True) else None
+    return CachedEncoder(name, revision, cache, batch_size=rcfg.get("index_batch_size", 32))
@@ -0,0 +1,110 @@
+"""src.load_bench
+===============
+
+Compare model load modes on this machine.
+
+Each mode overrides ``personas.load`` and runs in a fresh interpreter, so
+the resident memory of one mode does not leak into the next.  Each child
+loads the model through :func:`src.debate_loop._load_model`, decodes
+``--new-tokens`` greedy tokens for a fixed Latin prompt, and prints its
+report as one JSON line.  The parent prints a table of load seconds, RSS
+after load and after decoding, and tokens/sec.
+
+Modes::
+
+    config   personas.load as configured
+    fp32     full precision
+    bf16     bfloat16 weights
+    int8     dynamic int8 linear layers on CPU (bitsandbytes 8-bit on CUDA)
+
+CLI::
+
+    python -m src.load_bench --config configs/default.yaml --modes fp32 bf16 int8 --threads 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from typing import Dict
+
+from .config import load_config
+
+MODES: Dict[str, Dict] = {
+    "config": {},
+    "fp32": {"dtype": "fp32", "quant_4bit": False, "quant_int8": False},
+    "bf16": {"dtype": "bf16", "quant_4bit": False, "quant_int8": False},
+    "int8": {"dtype": "fp32", "quant_4bit": False, "quant_int8": True},
+}
+
+PROMPT = "Quaestio: utrum Deus sit. Responsio brevis Latine:"
+
+
+def _run_mode(cfg: Dict, mode: str, new_tokens: int, threads: int) -> Dict:
+    from .debate_loop import _load_model, _rss_mb, torch
+
+    load_cfg = dict(cfg["personas"].get("load") or {}, **MODES[mode])
+    if threads:
+        load_cfg["threads"] = threads
+    tokenizer, model, _, report = _load_model(cfg["personas"].get("model", "sshleifer/tiny-gpt2"), load_cfg)
+    inputs = tokenizer(PROMPT, return_tensors="pt").to(model.device)
+    with torch.no_grad():
+        start = time.perf_counter()
+        out = model.generate(
+            **inputs,
+            do_sample=False,
+            min_new_tokens=new_tokens,
+            max_new_tokens=new_tokens,
+            pad_token_id=tokenizer.eos_token_id,
+        )
+        seconds = time.perf_counter() - start
+    decoded = out.shape[1] - inputs["input_ids"].shape[1]
+    report.update(
+        bench_mode=mode,
+        threads=torch.get_num_threads(),
+        new_tokens=int(decoded),
+        tokens_per_s=round(decoded / seconds, 2) if seconds > 0 else 0.0,
+        rss_after_decode_mb=round(_rss_mb(), 1),
+    )
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", required=True)
+    ap.add_argument("--modes", nargs="+", choices=sorted(MODES), default=["config", "fp32", "bf16", "int8"])
+    ap.add_argument("--new-tokens", type=int, default=64)
+    ap.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 keeps the config value)")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    cfg = load_config(args.config)
+    if args.child:
+        print(json.dumps(_run_mode(cfg, args.modes[0], args.new_tokens, args.threads)))
+        return
+
+    reports = []
+    for mode in args.modes:
+        cmd = [
+            sys.executable, "-m", "src.load_bench", "--config", args.config, "--child",
+            "--modes", mode, "--new-tokens", str(args.new_tokens), "--threads", str(args.threads),
+        ]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"[load_bench] {mode} failed:\n{proc.stderr.strip()}", file=sys.stderr)
+            continue
+        reports.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print("mode\tresolved\tthreads\tload_s\trss_mb\trss_decode_mb\ttokens/s")
+    for r in reports:
+        print(
+            f"{r['bench_mode']}\t{r['mode']}\t{r['threads']}\t{r['load_s']:.2f}\t"
+            f"{r['rss_mb']:.0f}\t{r['rss_after_decode_mb']:.0f}\t{r['tokens_per_s']:.1f}"
+        )
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entry
+    main()
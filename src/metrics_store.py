@@ -0,0 +1,314 @@
+"""src.metrics_store
+===================
+
+Columnar, append-only store of per-turn metrics shared by all batches.
+
+Every stage appends one row per turn it touches (``debate``, ``gate``, or the
+dry-run's fabricated ``gate`` rows).  Each column is a flat little-endian
+binary file under ``runs/_metrics/``; string columns (batch, run, stage,
+speaker, topic) are dictionary-encoded as ``int32`` codes with the dictionary
+kept in ``dicts.json``.  Appends use only the standard library and take an
+exclusive ``fcntl`` lock, so concurrent workers can write safely.  Queries map
+the columns with :class:`numpy.memmap` and aggregate with vectorised
+``bincount`` calls, so KPIs over millions of turns take milliseconds instead of
+re-reading every per-turn JSON file.
+
+Every stage invocation gets its own ``run`` code; KPIs use the most recent
+``gate`` run of a batch so re-running a stage does not double count turns.
+
+CLI::
+
+    python -m src.metrics_store --config configs/default.yaml --batch latin_v1_001
+    python -m src.metrics_store --config configs/default.yaml --trend
+"""
+
+from __future__ import annotations
+
+import argparse
+import fcntl
+import json
+import math
+import os
+import time
+import uuid
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .config import load_config
+from .utils.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+# column -> (array typecode, numpy dtype, missing value)
+NUMERIC_COLUMNS = {
+    "words": ("i", "<i4", -1),
+    "citations": ("i", "<i4", -1),
+    "support_rate": ("f", "<f4", math.nan),
+    "latin_score": ("f", "<f4", math.nan),
+    "novelty": ("f", "<f4", math.nan),
+    "passed": ("b", "i1", -1),
+    "gen_ms": ("f", "<f4", math.nan),
+    "gate_ms": ("f", "<f4", math.nan),
+    "created_at": ("d", "<f8", math.nan),
+}
+CATEGORY_COLUMNS = ("batch_id", "run", "stage", "speaker", "topic")
+KPI_NAMES = ("support_rate_avg", "latinness_avg", "citations_avg", "words_avg", "novelty_max")
+
+DICTS_FILE = "dicts.json"
+META_FILE = "meta.json"
+LOCK_FILE = ".lock"
+
+
+def metrics_dir(cfg: Dict) -> Path:
+    return Path(cfg["paths"]["runs"]) / "_metrics"
+
+
+def new_run_id(stage: str) -> str:
+    return f"{stage}:{uuid.uuid4().hex[:8]}"
+
+
+def empty_kpis() -> Dict:
+    """``batch_kpis`` entry for a batch without gate rows: null KPIs, zero counts."""
+
+    return {"kpis": dict.fromkeys(KPI_NAMES), "counts": {"turns": 0, "accepted": 0, "rejected": 0}}
+
+
+def _coerce(col: str, code: str, v, missing):
+    """Convert ``v`` to the column's type; ``None``/NaN become ``missing``."""
+
+    if v is None:
+        return missing
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        raise ValueError(f"[metrics_store] {col} expects a number, got {v!r}") from None
+    if code in ("f", "d"):
+        return v
+    return int(round(v)) if math.isfinite(v) else missing
+
+
+class MetricsStore:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    # -- writing ------------------------------------------------------------
+
+    @contextmanager
+    def _locked(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / LOCK_FILE, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_json(self, name: str, default):
+        p = self.path / name
+        if not p.exists():
+            return default
+        with open(p, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_json(self, name: str, obj) -> None:
+        tmp = self.path / (name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False)
+        os.replace(tmp, self.path / name)
+
+    def append(self, rows: Iterable[Dict]) -> int:
+        """Append metric rows; unknown keys are ignored, missing ones stored as null.
+
+        Numeric values are coerced to the column type (``150.0`` words is
+        stored as ``150``); a non-numeric value raises ``ValueError`` before
+        anything is written.
+        Returns the total row count after the append.
+        """
+
+        rows = list(rows)
+        if not rows:
+            return self.count()
+        now = time.time()
+        with self._locked():
+            meta = self._read_json(META_FILE, {"count": 0})
+            dicts = self._read_json(DICTS_FILE, {c: [] for c in CATEGORY_COLUMNS})
+            index = {c: {v: i for i, v in enumerate(dicts[c])} for c in CATEGORY_COLUMNS}
+            self._truncate(meta["count"])
+
+            numeric = {}
+            for col, (code, _, missing) in NUMERIC_COLUMNS.items():
+                default = now if col == "created_at" else None
+                numeric[col] = array(code, (_coerce(col, code, r.get(col, default), missing) for r in rows))
+
+            for col in CATEGORY_COLUMNS:
+                codes = array("i")
+                for r in rows:
+                    v = r.get(col)
+                    if v is None:
+                        codes.append(-1)
+                        continue
+                    v = str(v)
+                    if v not in index[col]:
+                        index[col][v] = len(dicts[col])
+                        dicts[col].append(v)
+                    codes.append(index[col][v])
+                with open(self.path / f"{col}.bin", "ab") as f:
+                    codes.tofile(f)
+
+            for col, values in numeric.items():
+                with open(self.path / f"{col}.bin", "ab") as f:
+                    values.tofile(f)
+
+            self._write_json(DICTS_FILE, dicts)
+            meta["count"] += len(rows)
+            self._write_json(META_FILE, meta)
+            return meta["count"]
+
+    def _truncate(self, count: int) -> None:
+        """Cut every column back to ``count`` rows (drops a crashed writer's tail)."""
+
+        sizes = {c: array(t).itemsize for c, (t, _, _) in NUMERIC_COLUMNS.items()}
+        sizes.update({c: array("i").itemsize for c in CATEGORY_COLUMNS})
+        for col, size in sizes.items():
+            p = self.path / f"{col}.bin"
+            if p.exists() and p.stat().st_size > count * size:
+                os.truncate(p, count * size)
+
+    # -- reading ------------------------------------------------------------
+
+    def count(self) -> int:
+        return self._read_json(META_FILE, {"count": 0})["count"]
+
+    def dicts(self) -> Dict[str, List[str]]:
+        return self._read_json(DICTS_FILE, {c: [] for c in CATEGORY_COLUMNS})
+
+    def column(self, name: str):
+        n = self.count()
+        dtype = NUMERIC_COLUMNS[name][1] if name in NUMERIC_COLUMNS else "<i4"
+        if n == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.path / f"{name}.bin", dtype=dtype, mode="r", shape=(n,))
+
+
+def _latest_gate_rows(store: MetricsStore, dicts: Dict[str, List[str]]):
+    """Boolean mask of rows from each batch's most recent ``gate`` run.
+
+    Each run belongs to one batch and run codes grow with time, so the latest
+    run of a batch is the largest run code mapped to it.
+    """
+
+    n = store.count()
+    if n == 0 or "gate" not in dicts["stage"]:
+        return np.zeros(n, dtype=bool)
+    batch = store.column("batch_id")
+    run = store.column("run")
+    gate = (store.column("stage") == dicts["stage"].index("gate")) & (batch >= 0) & (run >= 0)
+
+    run_batch = np.full(len(dicts["run"]), -1, dtype=np.int64)
+    run_batch[run[gate]] = batch[gate]
+    gate_runs = np.flatnonzero(run_batch >= 0)  # ascending, so the last write per batch wins
+    latest = np.full(len(dicts["batch_id"]), -1, dtype=np.int64)
+    latest[run_batch[gate_runs]] = gate_runs
+    is_latest = np.zeros(len(dicts["run"]), dtype=bool)
+    is_latest[latest[latest >= 0]] = True
+    return gate & is_latest[run]
+
+
+def _segments(codes):
+    """Start offsets of runs of equal codes (rows of one run are appended together)."""
+
+    if len(codes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate([[0], np.flatnonzero(np.diff(codes)) + 1])
+
+
+def _group_mean(codes, starts, values, valid, ngroups: int):
+    if len(starts) == 0:
+        return np.full(ngroups, np.nan)
+    seg_codes = codes[starts]
+    sums = np.add.reduceat(np.where(valid, values, 0), starts, dtype=np.float64)
+    counts = np.add.reduceat(valid, starts, dtype=np.int64)
+    sums = np.bincount(seg_codes, weights=sums, minlength=ngroups)
+    counts = np.bincount(seg_codes, weights=counts, minlength=ngroups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def _group_max(codes, starts, values, valid, ngroups: int):
+    out = np.full(ngroups, np.nan)
+    if len(starts) == 0:
+        return out
+    seg_max = np.fmax.reduceat(np.where(valid, values, np.nan), starts)
+    np.fmax.at(out, codes[starts], seg_max.astype(np.float64))
+    return out
+
+
+def batch_kpis(store: MetricsStore) -> Dict[str, Dict]:
+    """KPIs for every batch, computed over its latest gate run."""
+
+    dicts = store.dicts()
+    rows = _latest_gate_rows(store, dicts)
+    nb = len(dicts["batch_id"])
+    if not rows.any():
+        return {}
+
+    batch = store.column("batch_id")[rows]
+    starts = _segments(batch)
+    col = {c: store.column(c)[rows] for c in ("words", "citations", "support_rate", "latin_score", "novelty", "passed")}
+    kpis = {  # keys as in KPI_NAMES
+        "support_rate_avg": _group_mean(batch, starts, col["support_rate"], ~np.isnan(col["support_rate"]), nb),
+        "latinness_avg": _group_mean(batch, starts, col["latin_score"], ~np.isnan(col["latin_score"]), nb),
+        "citations_avg": _group_mean(batch, starts, col["citations"], col["citations"] >= 0, nb),
+        "words_avg": _group_mean(batch, starts, col["words"], col["words"] >= 0, nb),
+        "novelty_max": _group_max(batch, starts, col["novelty"], ~np.isnan(col["novelty"]), nb),
+    }
+    passed = col["passed"]
+    turns = np.bincount(batch[starts], weights=np.diff(np.append(starts, len(batch))), minlength=nb).astype(np.int64)
+    accepted = np.bincount(batch[starts], weights=np.add.reduceat(passed == 1, starts, dtype=np.int64), minlength=nb).astype(np.int64)
+    rejected = np.bincount(batch[starts], weights=np.add.reduceat(passed == 0, starts, dtype=np.int64), minlength=nb).astype(np.int64)
+
+    out = {}
+    for b in np.flatnonzero(turns):
+        out[dicts["batch_id"][b]] = {
+            "kpis": {k: _clean(v[b]) for k, v in kpis.items()},
+            "counts": {"turns": int(turns[b]), "accepted": int(accepted[b]), "rejected": int(rejected[b])},
+        }
+    return out
+
+
+def _clean(v) -> Optional[float]:
+    v = float(v)
+    return None if math.isnan(v) else round(v, 4)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", required=True)
+    ap.add_argument("--batch", help="Only report this batch")
+    ap.add_argument("--trend", action="store_true", help="Print one KPI row per batch")
+    args = ap.parse_args()
+
+    cfg = load_config(args.config)
+    store = MetricsStore(metrics_dir(cfg))
+    start = time.perf_counter()
+    result = batch_kpis(store)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if args.batch:
+        if args.batch not in result:
+            raise SystemExit(f"[metrics_store] No gate metrics for batch {args.batch}")
+        print(json.dumps({args.batch: result[args.batch]}, ensure_ascii=False, indent=2))
+    elif args.trend:
+        print("batch_id\tturns\taccepted\t" + "\t".join(KPI_NAMES))
+        for b, r in result.items():
+            vals = "\t".join("-" if r["kpis"][k] is None else f"{r['kpis'][k]:.3f}" for k in KPI_NAMES)
+            print(f"{b}\t{r['counts']['turns']}\t{r['counts']['accepted']}\t{vals}")
+    else:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    print(f"[metrics_store] {store.count()} rows aggregated in {elapsed_ms:.1f} ms")
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entry
+    main()
@@ -3,7 +3,9 @@
 
 Create DPO (Direct Preference Optimisation) training pairs for a given batch.
 The script reads accepted and rejected turns from ``runs/<batch_id>`` and
-emits a JSONL shard matching :mod:`schemas/dpo.schema.json`.
+emits a JSONL shard matching :mod:`schemas/dpo.schema.json`.  Turns already
+compacted into the batch's archive pack are read from it, under the batch
+lock.
 
 For each ``(speaker, topic)`` combination exactly one entry is produced.  A
 rejected turn with the same ``speaker`` and ``topic`` is preferred; if none is
@@ -19,12 +21,11 @@ import uuid
 from pathlib import Path
 from typing import Dict, Any, Tuple
 
+from .storage_tier import batch_lock, is_archived, publish, read_batch_files, reopen_batch
 
-def _load_turn(path: Path) -> Dict[str, Any]:
-    """Normalise an accepted or rejected turn into a flat dict."""
 
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+def _load_turn(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalise an accepted or rejected turn into a flat dict."""
 
     meta = data.get("meta", {})
     return {
@@ -49,54 +50,57 @@ def main() -> None:
     batch_id = args.batch
     base_dir = Path("runs") / batch_id
     acc_dir = base_dir / "accepted"
-    rej_dir = base_dir / "rejected"
     out_dir = Path("datasets") / "dpo"
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    if not acc_dir.exists():
+    if not acc_dir.exists() and not is_archived(base_dir):
         raise SystemExit(f"[pack_dpo] Missing directory: {acc_dir}")
 
-    accepted: Dict[Tuple[str, str], Dict[str, Any]] = {}
-    for fp in sorted(acc_dir.glob("*.json")):
-        t = _load_turn(fp)
-        accepted[(t["speaker"], t["topic"])] = t
+    with batch_lock(base_dir):
+        accepted: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for _, raw in read_batch_files(base_dir, "accepted"):
+            t = _load_turn(json.loads(raw))
+            accepted[(t["speaker"], t["topic"])] = t
 
-    rejected: Dict[Tuple[str, str], Dict[str, Any]] = {}
-    if rej_dir.exists():
-        for fp in sorted(rej_dir.glob("*.json")):
-            t = _load_turn(fp)
+        rejected: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for _, raw in read_batch_files(base_dir, "rejected"):
+            t = _load_turn(json.loads(raw))
             rejected[(t["speaker"], t["topic"])] = t
 
-    items = []
-    for key, acc in accepted.items():
-        rej = rejected.get(key)
-        if rej:
-            rejected_text = rej["response"]
-            audit_diffs = "rejected"
-        else:
-            # Ablated negative: prefix to indicate non-preferred variant
-            rejected_text = f"(ablated) {acc['response']}"
-            audit_diffs = "ablated accepted; no rejected turn"
-
-        items.append(
-            {
-                "id": f"{batch_id}.{uuid.uuid4().hex[:8]}",
-                "prompt": acc["prompt"],
-                "chosen": acc["response"],
-                "rejected": rejected_text,
-                "meta": {
-                    "speaker": acc["speaker"],
-                    "topic": acc["topic"],
-                    "batch_id": batch_id,
-                    "audit_diffs": audit_diffs,
-                },
-            }
-        )
-
-    out_path = out_dir / f"{batch_id}.jsonl"
-    with open(out_path, "w", encoding="utf-8") as f:
-        for it in items:
-            f.write(json.dumps(it, ensure_ascii=False) + "\n")
+        items = []
+        for key, acc in accepted.items():
+            rej = rejected.get(key)
+            if rej:
+                rejected_text = rej["response"]
+                audit_diffs = "rejected"
+            else:
+                # Ablated negative: prefix to indicate non-preferred variant
+                rejected_text = f"(ablated) {acc['response']}"
+                audit_diffs = "ablated accepted; no rejected turn"
+
+            items.append(
+                {
+                    "id": f"{batch_id}.{uuid.uuid4().hex[:8]}",
+                    "prompt": acc["prompt"],
+                    "chosen": acc["response"],
+                    "rejected": rejected_text,
+                    "meta": {
+                        "speaker": acc["speaker"],
+                        "topic": acc["topic"],
+                        "batch_id": batch_id,
+                        "audit_diffs": audit_diffs,
+                    },
+                }
+            )
+
+        # Stage next to the run (SSD tier) and publish to datasets/ in one sequential copy
+        staged = base_dir / "staging" / f"{batch_id}.dpo.jsonl"
+        staged.parent.mkdir(parents=True, exist_ok=True)
+        with open(staged, "w", encoding="utf-8") as f:
+            for it in items:
+                f.write(json.dumps(it, ensure_ascii=False) + "\n")
+        out_path = publish(staged, out_dir / f"{batch_id}.jsonl")
+        reopen_batch(base_dir)  # archive the new staging file too
 
     print(f"[pack_dpo] Wrote {out_path} ({len(items)} items)")
 
@@ -28,8 +28,10 @@ turn is::
         }
     }
 
-Only files under ``runs/<batch_id>/accepted`` are inspected.  The resulting
-shard is written to ``datasets/sft/<batch_id>.jsonl`` and can be validated via
+Only files under ``runs/<batch_id>/accepted`` are inspected, including ones
+already compacted into the batch's archive pack.  The batch lock is held
+throughout, so a background compactor cannot archive the batch mid-read.  The
+resulting shard is written to ``datasets/sft/<batch_id>.jsonl`` and can be validated via
 ``python -m src.validate_jsonl``.
 """
 
@@ -41,8 +43,10 @@ import uuid
 from pathlib import Path
 from typing import Dict, Any
 
+from .storage_tier import batch_lock, is_archived, publish, read_batch_files, reopen_batch
 
-def _load_turn(path: Path) -> Dict[str, Any]:
+
+def _load_turn(data: Dict[str, Any]) -> Dict[str, Any]:
     """Return a normalised representation of a turn.
 
     The accepted turn files produced by earlier pipeline stages may vary in
@@ -50,9 +54,6 @@ def _load_turn(path: Path) -> Dict[str, Any]:
     providing sensible defaults when optional information is missing.
     """
 
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
     meta = data.get("meta", {})
     turn = {
         "instruction": data.get("instruction")
@@ -82,38 +83,44 @@ def main() -> None:
     args = ap.parse_args()
 
     batch_id = args.batch
-    runs_dir = Path("runs") / batch_id / "accepted"
+    batch_dir = Path("runs") / batch_id
+    runs_dir = batch_dir / "accepted"
     out_dir = Path("datasets") / "sft"
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    if not runs_dir.exists():
+    if not runs_dir.exists() and not is_archived(batch_dir):
         raise SystemExit(f"[pack_sft] Missing directory: {runs_dir}")
 
-    items = []
-    for fp in sorted(runs_dir.glob("*.json")):
-        turn = _load_turn(fp)
-        item = {
-            "id": f"{batch_id}.{uuid.uuid4().hex[:8]}",
-            "instruction": turn["instruction"],
-            "response": turn["response"],
-            "meta": {
-                "speaker": turn["speaker"],
-                "topic": turn["topic"],
-                "citations": turn["citations"],
-                "provenance": turn["provenance"],
-                "audit_summary": turn["audit_summary"],
-                "batch_id": batch_id,
-                "encoder": turn["encoder"],
-                "model": turn["model"],
-                "commit": turn["commit"],
-            },
-        }
-        items.append(item)
-
-    out_path = out_dir / f"{batch_id}.jsonl"
-    with open(out_path, "w", encoding="utf-8") as f:
-        for it in items:
-            f.write(json.dumps(it, ensure_ascii=False) + "\n")
+    with batch_lock(batch_dir):
+        items = []
+        for _, raw in read_batch_files(batch_dir, "accepted"):
+            turn = _load_turn(json.loads(raw))
+            item = {
+                "id": f"{batch_id}.{uuid.uuid4().hex[:8]}",
+                "instruction": turn["instruction"],
+                "response": turn["response"],
+                "meta": {
+                    "speaker": turn["speaker"],
+                    "topic": turn["topic"],
+                    "citations": turn["citations"],
+                    "provenance": turn["provenance"],
+                    "audit_summary": turn["audit_summary"],
+                    "batch_id": batch_id,
+                    "encoder": turn["encoder"],
+                    "model": turn["model"],
+                    "commit": turn["commit"],
+                },
+            }
+            items.append(item)
+
+        # Stage next to the run (SSD tier) and publish to datasets/ in one sequential copy
+        staged = batch_dir / "staging" / f"{batch_id}.sft.jsonl"
+        staged.parent.mkdir(parents=True, exist_ok=True)
+        with open(staged, "w", encoding="utf-8") as f:
+            for it in items:
+                f.write(json.dumps(it, ensure_ascii=False) + "\n")
+        out_path = publish(staged, out_dir / f"{batch_id}.jsonl")
+        reopen_batch(batch_dir)  # archive the new staging file too
 
     print(f"[pack_sft] Wrote {out_path} ({len(items)} items)")
 
@@ -8,15 +8,22 @@ stub audit files that already contain the necessary ``metrics`` object.
 The previous implementation performed the gating comparison directly inside the
 main loop with a long boolean expression.  For readability and unit testing, the
 comparison is now encapsulated in :func:`_passes_gate`.
+
+The batch lock is held while gating, so a background compactor cannot archive
+the batch mid-run.  Audits that were already archived are read from the pack,
+and the batch is then reopened so the new results get archived as well.
 """
 
 from __future__ import annotations
 
 import argparse
 import json
+import time
 from pathlib import Path
 
 from .config import load_config
+from .metrics_store import MetricsStore, metrics_dir, new_run_id
+from .storage_tier import batch_lock, read_batch_files, reopen_batch
 from .utils.logging import write_json
 
 
@@ -53,27 +60,44 @@ def main() -> None:
     }
 
     runs_dir = Path(cfg["paths"]["runs"]) / args.batch
-    audits_dir = runs_dir / "audits"
     accepted_dir = runs_dir / "accepted"
     rejected_dir = runs_dir / "rejected"
     accepted_dir.mkdir(parents=True, exist_ok=True)
     rejected_dir.mkdir(parents=True, exist_ok=True)
 
     count = 0
-    for audit_path in audits_dir.glob("*.json"):
-        with open(audit_path, "r", encoding="utf-8") as f:
-            audit = json.load(f)
-        metrics = audit.get("metrics", {})
-        passed = _passes_gate(metrics, thresholds)
-        dest = accepted_dir if passed else rejected_dir
-        result = {
-            "turn_id": audit.get("turn_id"),
-            "passed": passed,
-            "metrics": metrics,
-            "thresholds": thresholds,
-        }
-        write_json(dest / audit_path.name, result)
-        count += 1
+    run_id = new_run_id("gate")
+    metric_rows = []
+    with batch_lock(runs_dir):
+        for name, raw in read_batch_files(runs_dir, "audits"):
+            start = time.perf_counter()
+            audit = json.loads(raw)
+            metrics = audit.get("metrics", {})
+            passed = _passes_gate(metrics, thresholds)
+            dest = accepted_dir if passed else rejected_dir
+            result = {
+                "turn_id": audit.get("turn_id"),
+                "passed": passed,
+                "metrics": metrics,
+                "thresholds": thresholds,
+            }
+            write_json(dest / name, result)
+            metric_rows.append(
+                {
+                    **{k: metrics.get(k) for k in ("words", "citations", "support_rate", "latin_score", "novelty")},
+                    "batch_id": args.batch,
+                    "run": run_id,
+                    "stage": "gate",
+                    "speaker": audit.get("speaker"),
+                    "topic": audit.get("topic"),
+                    "passed": passed,
+                    "gate_ms": (time.perf_counter() - start) * 1000,
+                }
+            )
+            count += 1
+        reopen_batch(runs_dir)
+
+    MetricsStore(metrics_dir(cfg)).append(metric_rows)
 
     print(f"[quality_gate] Evaluated {count} audits")
 
@@ -0,0 +1,177 @@
+"""src.rerank
+============
+
+Optional cross-encoder reranking of fused BM25/dense candidates.
+
+:func:`src.debate_loop._hybrid_search` fuses a candidate pool of
+``auditor.bm25_k`` + ``auditor.dense_k`` hits with RRF.  When
+``auditor.reranker`` is enabled, :class:`CrossEncoderReranker` rescores the
+``(query, passage)`` pairs of that pool and keeps the best ``k``.
+
+Scoring is the expensive part, so:
+
+* pairs are sorted by passage length and scored in large batches, keeping
+  padding inside each CPU forward pass small;
+* scores persist in a SQLite cache keyed by ``(model, query hash, passage
+  id)``, so re-audits and repeated claims never re-run the cross-encoder.
+  The passage id is a hash of the passage text, which stays valid when the
+  corpus is re-indexed.
+
+Per-query latency and cache hit counters are kept in :attr:`stats`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from .utils.lazy import lazy_import
+
+sentence_transformers = lazy_import("sentence_transformers")
+
+DEFAULT_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class PairScoreCache:
+    """Persistent ``(model, query hash, passage id) -> score`` table.
+
+    The connection may be used from any thread (the retrieval service builds
+    it in the main thread and reranks on its batcher thread); a lock
+    serializes access.
+    """
+
+    def __init__(self, path: Path, model_name: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.db = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "model TEXT, qhash TEXT, pid TEXT, score REAL, PRIMARY KEY (model, qhash, pid))"
+        )
+
+    def get_many(self, qhash: str, pids: Sequence[str]) -> Dict[str, float]:
+        if not pids:
+            return {}
+        marks = ",".join("?" * len(pids))
+        with self._lock:
+            rows = self.db.execute(
+                f"SELECT pid, score FROM scores WHERE model = ? AND qhash = ? AND pid IN ({marks})",
+                (self.model_name, qhash, *pids),
+            )
+            return dict(rows.fetchall())
+
+    def put_many(self, items: Sequence[tuple]) -> None:
+        """Store ``(qhash, pid, score)`` triples."""
+
+        with self._lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?)",
+                [(self.model_name, q, p, float(s)) for q, p, s in items],
+            )
+
+
+class CrossEncoderReranker:
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        cache: Optional[PairScoreCache] = None,
+        batch_size: int = 64,
+        max_length: int = 512,
+        device: str = "cpu",
+        model=None,
+    ):
+        self.model_name = model_name
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.device = device
+        self._model = model
+        self.stats = {"queries": 0, "pairs": 0, "cache_hits": 0, "scored": 0, "seconds": 0.0}
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = sentence_transformers.CrossEncoder(
+                self.model_name, max_length=self.max_length, device=self.device
+            )
+        return self._model
+
+    def _score(self, pairs: List[tuple]) -> List[float]:
+        """Score ``(query, passage)`` pairs in length-sorted batches."""
+
+        order = sorted(range(len(pairs)), key=lambda i: len(pairs[i][0]) + len(pairs[i][1]))
+        scores = [0.0] * len(pairs)
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start : start + self.batch_size]
+            batch = [pairs[i] for i in idx]
+            out = self.model.predict(batch, batch_size=len(batch), show_progress_bar=False)
+            for i, s in zip(idx, out):
+                scores[i] = float(s)
+        self.stats["scored"] += len(pairs)
+        return scores
+
+    def rerank_many(self, queries: Sequence[str], candidates: Sequence[List[Dict]], k: int) -> List[List[Dict]]:
+        """Rerank several candidate pools at once; uncached pairs share batches."""
+
+        start = time.perf_counter()
+        qhashes = [_hash(q) for q in queries]
+        known: List[Dict[str, float]] = []
+        missing: List[tuple] = []  # (query index, pid, passage text)
+        for qi, (qh, cands) in enumerate(zip(qhashes, candidates)):
+            pids = list(dict.fromkeys(_hash(c["text"]) for c in cands))
+            cached = self.cache.get_many(qh, pids) if self.cache else {}
+            known.append(cached)
+            self.stats["cache_hits"] += len(cached)
+            seen = set(cached)
+            for c in cands:
+                pid = _hash(c["text"])
+                if pid not in seen:
+                    seen.add(pid)
+                    missing.append((qi, pid, c["text"]))
+            self.stats["pairs"] += len(pids)
+
+        if missing:
+            scores = self._score([(queries[qi], text) for qi, _, text in missing])
+            for (qi, pid, _), s in zip(missing, scores):
+                known[qi][pid] = s
+            if self.cache:
+                self.cache.put_many([(qhashes[qi], pid, s) for (qi, pid, _), s in zip(missing, scores)])
+
+        results = []
+        for qi, cands in enumerate(candidates):
+            rescored = [dict(c, rerank_score=known[qi][_hash(c["text"])]) for c in cands]
+            rescored.sort(key=lambda c: c["rerank_score"], reverse=True)
+            results.append(rescored[:k])
+        self.stats["queries"] += len(queries)
+        self.stats["seconds"] += time.perf_counter() - start
+        return results
+
+    def rerank(self, query: str, candidates: List[Dict], k: int) -> List[Dict]:
+        return self.rerank_many([query], [candidates], k)[0]
+
+    def latency_ms(self) -> float:
+        """Average added latency per query, in milliseconds."""
+
+        q = self.stats["queries"]
+        return 1000.0 * self.stats["seconds"] / q if q else 0.0
+
+
+def make_reranker(cfg: Dict) -> Optional[CrossEncoderReranker]:
+    """Build the reranker configured under ``auditor`` or ``None`` if disabled."""
+
+    aud = cfg.get("auditor", {})
+    if not aud.get("reranker"):
+        return None
+    model_name = aud.get("reranker_model", DEFAULT_MODEL)
+    cache = PairScoreCache(Path(cfg["paths"]["indices"]) / "rerank_cache.sqlite", model_name)
+    return CrossEncoderReranker(model_name, cache=cache, batch_size=aud.get("reranker_batch_size", 64))
@@ -0,0 +1,281 @@
+"""src.retrieval_service
+=======================
+
+Local retrieval server shared by debate and audit workers.
+
+Without it every worker process runs ``_prepare_retrieval`` and holds its own
+BM25 index, encoder and dense index.  The service loads them once and answers
+``search`` requests over a Unix socket (``retrieval.service.socket``) or a
+localhost TCP port (``retrieval.service.port``).
+
+Concurrent requests are coalesced by :class:`MicroBatcher`: the first request
+opens a batch, which closes when ``max_batch`` requests are queued or
+``max_wait_ms`` has passed, and then runs as one
+:func:`src.debate_loop._hybrid_search_batch` call (one encoder forward pass
+and one dense search for all queries).  Latency and throughput counters are
+returned by the ``stats`` request, together with the reranker's per-query
+latency and cache hits when ``auditor.reranker`` is enabled.
+
+Protocol: one JSON object per line in each direction::
+
+    {"op": "search", "query": "...", "k": 6}  ->  {"results": [...]}
+    {"op": "stats"}                            ->  {"stats": {...}}
+
+Workers opt in with ``retrieval.mode: service``; see
+:func:`src.debate_loop._make_searcher`.
+
+CLI::
+
+    python -m src.retrieval_service --config configs/default.yaml
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .config import load_config
+
+SearchBatch = Callable[[Sequence[str], int], List[List[Dict]]]
+
+DEFAULT_SOCKET = "/tmp/ptdf-retrieval.sock"
+
+
+class _Request:
+    __slots__ = ("query", "k", "done", "result", "error", "t0")
+
+    def __init__(self, query: str, k: int):
+        self.query = query
+        self.k = k
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.t0 = time.perf_counter()
+
+
+class MicroBatcher:
+    """Coalesce concurrent searches into batches under a max-wait deadline."""
+
+    def __init__(self, search_batch: SearchBatch, max_batch: int = 32, max_wait_ms: float = 5.0, reranker=None):
+        self.search_batch = search_batch
+        self.reranker = reranker
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._stats = {"requests": 0, "batches": 0, "latency_ms_sum": 0.0, "latency_ms_max": 0.0, "search_ms_sum": 0.0}
+        self._thread = threading.Thread(target=self._loop, name="retrieval-batcher", daemon=True)
+        self._thread.start()
+
+    def search(self, query: str, k: int = 6) -> List[Dict]:
+        req = _Request(query, k)
+        self._queue.put(req)
+        req.done.wait()
+        if req.error is not None:
+            raise RuntimeError(req.error)
+        return req.result
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first: _Request) -> List[_Request]:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # let the loop see the shutdown after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            start = time.perf_counter()
+            by_k: Dict[int, List[_Request]] = {}
+            for req in batch:
+                by_k.setdefault(req.k, []).append(req)
+            for k, reqs in by_k.items():
+                try:
+                    results = self.search_batch([r.query for r in reqs], k)
+                    for r, res in zip(reqs, results):
+                        r.result = res
+                except Exception as e:  # surface to every waiting client
+                    for r in reqs:
+                        r.error = f"{type(e).__name__}: {e}"
+            end = time.perf_counter()
+            with self._lock:
+                st = self._stats
+                st["requests"] += len(batch)
+                st["batches"] += 1
+                st["search_ms_sum"] += (end - start) * 1000
+                for r in batch:
+                    lat = (end - r.t0) * 1000
+                    st["latency_ms_sum"] += lat
+                    st["latency_ms_max"] = max(st["latency_ms_max"], lat)
+            for r in batch:
+                r.done.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            st = dict(self._stats)
+        n, b = st["requests"], st["batches"]
+        uptime = time.perf_counter() - self._started
+        out = {
+            "requests": n,
+            "batches": b,
+            "mean_batch_size": n / b if b else 0.0,
+            "mean_latency_ms": st["latency_ms_sum"] / n if n else 0.0,
+            "max_latency_ms": st["latency_ms_max"],
+            "mean_search_ms_per_batch": st["search_ms_sum"] / b if b else 0.0,
+            "throughput_qps": n / uptime if uptime > 0 else 0.0,
+            "uptime_s": uptime,
+        }
+        if self.reranker is not None:
+            rs = self.reranker.stats
+            out["rerank"] = {
+                "latency_ms": self.reranker.latency_ms(),
+                "queries": rs["queries"],
+                "pairs": rs["pairs"],
+                "cache_hits": rs["cache_hits"],
+                "scored": rs["scored"],
+            }
+        return out
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        batcher: MicroBatcher = self.server.batcher
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                msg = json.loads(line)
+                if msg.get("op") == "stats":
+                    reply = {"stats": batcher.stats()}
+                elif msg.get("op") == "search":
+                    reply = {"results": batcher.search(msg["query"], int(msg.get("k", 6)))}
+                else:
+                    reply = {"error": f"unknown op: {msg.get('op')!r}"}
+            except Exception as e:
+                reply = {"error": f"{type(e).__name__}: {e}"}
+            self.wfile.write((json.dumps(reply, ensure_ascii=False, default=float) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128  # Unix sockets refuse connects (EAGAIN) once the backlog is full
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+def serve(batcher: MicroBatcher, socket_path: Optional[str] = None, port: Optional[int] = None):
+    """Create (but do not start) a server bound to a Unix socket or 127.0.0.1:port."""
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = _UnixServer(socket_path, _Handler)
+    else:
+        server = _TCPServer(("127.0.0.1", port or 0), _Handler)
+    server.batcher = batcher
+    return server
+
+
+class RetrievalClient:
+    """Blocking client; one connection per instance, safe to share across threads."""
+
+    def __init__(self, socket_path: Optional[str] = None, port: Optional[int] = None, timeout: float = 60.0):
+        if socket_path:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(timeout)
+            self._sock.connect(socket_path)
+        else:
+            self._sock = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+        self._rfile = self._sock.makefile("rb")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg: Dict) -> "RetrievalClient":
+        svc = cfg.get("retrieval", {}).get("service", {})
+        if svc.get("port"):
+            return cls(port=int(svc["port"]))
+        return cls(socket_path=svc.get("socket", DEFAULT_SOCKET))
+
+    def _call(self, msg: Dict) -> Dict:
+        with self._lock:
+            self._sock.sendall((json.dumps(msg, ensure_ascii=False) + "\n").encode("utf-8"))
+            line = self._rfile.readline()
+        if not line:
+            raise ConnectionError("retrieval service closed the connection")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RuntimeError(f"retrieval service: {reply['error']}")
+        return reply
+
+    def search(self, query: str, k: int = 6) -> List[Dict]:
+        return self._call({"op": "search", "query": query, "k": k})["results"]
+
+    def stats(self) -> Dict:
+        return self._call({"op": "stats"})["stats"]
+
+    def close(self) -> None:
+        self._rfile.close()
+        self._sock.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", required=True)
+    args = ap.parse_args()
+
+    from .debate_loop import _load_retrieval
+
+    cfg = load_config(args.config)
+    svc = cfg.get("retrieval", {}).get("service", {})
+    search_batch, reranker = _load_retrieval(cfg)
+    batcher = MicroBatcher(
+        search_batch, max_batch=svc.get("max_batch", 32), max_wait_ms=svc.get("max_wait_ms", 5.0), reranker=reranker
+    )
+    socket_path = None if svc.get("port") else svc.get("socket", DEFAULT_SOCKET)
+    server = serve(batcher, socket_path=socket_path, port=svc.get("port"))
+    where = socket_path or f"127.0.0.1:{server.server_address[1]}"
+    print(f"[retrieval_service] listening on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+        print(f"[retrieval_service] stats: {json.dumps(batcher.stats())}")
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entry
+    main()
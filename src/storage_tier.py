@@ -0,0 +1,413 @@
+"""src.storage_tier
+==================
+
+SSD/HDD storage tiering for batch artifacts.
+
+``paths.runs`` and ``paths.indices`` live on the SSD tier, ``paths.datasets``
+and ``storage.archive`` on the HDD tier.  The rules are:
+
+* small random I/O (per-turn JSON, staging shards) stays on the SSD;
+* the HDD only receives large sequential writes: shards are staged on the SSD
+  and published with :func:`publish` in ``storage.block_mb`` chunks, and
+  finished batch directories are compacted by :func:`compact_batch` into a
+  single file of zlib-compressed blocks plus a JSON member index;
+* :class:`BackgroundCompactor` archives finished batches (those with a
+  ``summary.json``) in a daemon thread while the next batch generates;
+* :class:`DiskWatermark` throttles generation while free space on a tier is
+  below its watermark, nudging the compactor to free the SSD.
+
+Archive layout (``<archive>/<batch_id>.pack``): the compressed blocks, then
+a JSON index, then a 16-byte footer (index length, ``PACK_MAGIC``)::
+
+    {"blocks": [[file_offset, compressed_len, raw_len], ...],
+     "members": {"generated/x.json": [block, offset_in_block, length], ...}}
+
+Members are packed in sorted path order and never straddle blocks unless they
+are larger than a block (then they get a block of their own).  Blocks and
+index live in one file, so a pack is replaced with a single atomic rename.
+
+A runner holds :func:`batch_lock` on its batch directory for the whole run,
+and so do the standalone gate and pack stages.  Compaction skips locked
+batches, so another process's compactor never packs a batch that is being
+(re)generated or read.  Those stages use :func:`read_batch_files`, which
+also finds members that were already archived.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import shutil
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .utils.logging import now_iso
+
+MB = 1024 * 1024
+GB = 1024 * MB
+PACK_MAGIC = b"PTDFPAK1"
+_FOOTER = struct.Struct("<Q8s")
+ARCHIVED_MARKER = "archived.json"
+LOCK_FILE = ".lock"
+KEEP_FILES = {"summary.json", ARCHIVED_MARKER, LOCK_FILE}
+
+
+def publish(src: Path, dest: Path, block_bytes: int = 8 * MB) -> Path:
+    """Copy ``src`` (SSD staging) to ``dest`` (HDD) in large sequential blocks.
+
+    The copy goes to ``dest.tmp`` and is fsynced before an atomic rename, so
+    readers never see a partial shard.
+    """
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".tmp")
+    with open(src, "rb", buffering=0) as fi, open(tmp, "wb", buffering=0) as fo:
+        while True:
+            chunk = fi.read(block_bytes)
+            if not chunk:
+                break
+            fo.write(chunk)
+        fo.flush()
+        os.fsync(fo.fileno())
+    os.replace(tmp, dest)
+    return dest
+
+
+@contextmanager
+def batch_lock(batch_dir: Path, blocking: bool = True):
+    """Exclusive ``fcntl`` lock on ``<batch_dir>/.lock``.
+
+    The runner holds it for a whole batch, compaction takes it without
+    waiting.  With ``blocking=False`` this yields ``False`` if another
+    process holds the lock.
+    """
+
+    batch_dir = Path(batch_dir)
+    batch_dir.mkdir(parents=True, exist_ok=True)
+    with open(batch_dir / LOCK_FILE, "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _members(batch_dir: Path) -> List[Path]:
+    return sorted(
+        p for p in batch_dir.rglob("*") if p.is_file() and p.relative_to(batch_dir).as_posix() not in KEEP_FILES
+    )
+
+
+def _read_marker(batch_dir: Path) -> Optional[Dict]:
+    try:
+        with open(batch_dir / ARCHIVED_MARKER, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        return {}
+
+
+def _is_pending(batch_dir: Path) -> bool:
+    """Finished (has ``summary.json``) and not completely archived."""
+
+    return (batch_dir / "summary.json").exists() and not (_read_marker(batch_dir) or {}).get("complete")
+
+
+def _replace_json(path: Path, obj: Dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _fsync_dir(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_pack(pack_path: Path, batch_id: str, sources: List[Tuple[str, Callable[[], bytes]]],
+                block_bytes: int) -> Dict:
+    """Write ``sources`` (``(name, read)`` in sorted order) to ``pack_path`` atomically."""
+
+    tmp_pack = pack_path.with_name(pack_path.name + ".tmp")
+    blocks: List[List[int]] = []
+    members: Dict[str, List[int]] = {}
+    buf = bytearray()
+    raw_total = 0
+
+    with open(tmp_pack, "wb", buffering=0) as out:
+
+        def flush():
+            if not buf:
+                return
+            data = zlib.compress(bytes(buf), 6)
+            blocks.append([out.tell(), len(data), len(buf)])
+            out.write(data)
+            buf.clear()
+
+        for name, read in sources:
+            data = read()
+            if buf and len(buf) + len(data) > block_bytes:
+                flush()
+            members[name] = [len(blocks), len(buf), len(data)]
+            buf += data
+            raw_total += len(data)
+        flush()
+        stats = {
+            "pack": str(pack_path),
+            "files": len(members),
+            "raw_bytes": raw_total,
+            "packed_bytes": out.tell(),
+            "blocks": len(blocks),
+        }
+        index = {"batch_id": batch_id, "created_at": now_iso(), "stats": stats, "blocks": blocks, "members": members}
+        data = json.dumps(index, ensure_ascii=False).encode("utf-8")
+        out.write(data + _FOOTER.pack(len(data), PACK_MAGIC))
+        os.fsync(out.fileno())
+    os.replace(tmp_pack, pack_path)
+    _fsync_dir(pack_path.parent)
+    return stats
+
+
+def compact_batch(batch_dir: Path, archive_dir: Path, block_bytes: int = 8 * MB,
+                  remove: bool = True) -> Optional[Dict]:
+    """Pack every file under ``batch_dir`` into ``<archive_dir>/<batch>.pack``.
+
+    An existing pack is never dropped: its members are merged into the new
+    pack, with files still on disk taking precedence.  This covers both a
+    deletion that was interrupted and a re-run of an archived batch id.  The
+    ``archived.json`` marker is written once the pack is in place, before
+    anything is deleted, and gets ``"complete": true`` afterwards.  With
+    ``remove=True`` only ``summary.json`` and the marker are left in
+    ``batch_dir``.
+
+    Returns ``None`` if a runner holds the batch lock or the batch is no
+    longer pending.
+    """
+
+    batch_dir, archive_dir = Path(batch_dir), Path(archive_dir)
+    with batch_lock(batch_dir, blocking=False) as locked:
+        if not locked or not _is_pending(batch_dir):
+            return None
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        pack_path = archive_dir / f"{batch_dir.name}.pack"
+        files = {p.relative_to(batch_dir).as_posix(): p for p in _members(batch_dir)}
+        previous = PackReader(pack_path) if pack_path.exists() else None
+        carried = [n for n in previous.names() if n not in files] if previous else []
+
+        if previous is None or files:
+            sources = [(n, p.read_bytes) for n, p in files.items()]
+            sources += [(n, partial(previous.read, n)) for n in carried]
+            stats = _write_pack(pack_path, batch_dir.name, sorted(sources, key=lambda s: s[0]), block_bytes)
+        else:  # deletion finished but the marker was not updated
+            stats = previous.index["stats"]
+
+        marker = {**stats, "merged": len(carried), "complete": False, "archived_at": now_iso()}
+        _replace_json(batch_dir / ARCHIVED_MARKER, marker)
+        if remove:
+            for p in files.values():
+                p.unlink()
+            for d in sorted((d for d in batch_dir.rglob("*") if d.is_dir()), reverse=True):
+                if not any(d.iterdir()):
+                    d.rmdir()
+        marker["complete"] = True
+        _replace_json(batch_dir / ARCHIVED_MARKER, marker)
+        return marker
+
+
+class PackReader:
+    """Random access to members of a compacted batch."""
+
+    def __init__(self, pack_path: Path):
+        self.pack_path = Path(pack_path)
+        with open(self.pack_path, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size >= _FOOTER.size:
+                f.seek(size - _FOOTER.size)
+                length, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+            if size < _FOOTER.size or magic != PACK_MAGIC:
+                raise ValueError(f"{self.pack_path} is not a batch pack")
+            f.seek(size - _FOOTER.size - length)
+            self.index = json.loads(f.read(length).decode("utf-8"))
+        self._cache_block: Optional[int] = None
+        self._cache_data = b""
+
+    def names(self) -> List[str]:
+        return list(self.index["members"])
+
+    def _block(self, i: int) -> bytes:
+        if self._cache_block != i:
+            offset, size, _ = self.index["blocks"][i]
+            with open(self.pack_path, "rb") as f:
+                f.seek(offset)
+                self._cache_data = zlib.decompress(f.read(size))
+            self._cache_block = i
+        return self._cache_data
+
+    def read(self, name: str) -> bytes:
+        block, offset, length = self.index["members"][name]
+        return self._block(block)[offset : offset + length]
+
+    def read_json(self, name: str):
+        return json.loads(self.read(name))
+
+
+def read_batch_files(batch_dir: Path, subdir: str, suffix: str = ".json") -> List[Tuple[str, bytes]]:
+    """Sorted ``(name, data)`` of ``<batch_dir>/<subdir>/*<suffix>``, archived or not.
+
+    Members of the pack named in ``archived.json`` are read first.  Files
+    still on disk take precedence, as in :func:`compact_batch`.  Hold
+    :func:`batch_lock` so a compactor cannot delete files mid-read.
+    """
+
+    batch_dir = Path(batch_dir)
+    prefix = f"{subdir}/"
+    found: Dict[str, Callable[[], bytes]] = {}
+    marker = _read_marker(batch_dir)
+    if marker and marker.get("pack"):
+        reader = PackReader(Path(marker["pack"]))
+        for name in reader.names():
+            rest = name[len(prefix):]
+            if name.startswith(prefix) and rest.endswith(suffix) and "/" not in rest:
+                found[rest] = partial(reader.read, name)
+    if (batch_dir / subdir).is_dir():
+        for path in (batch_dir / subdir).glob(f"*{suffix}"):
+            found[path.name] = path.read_bytes
+    return [(name, found[name]()) for name in sorted(found)]
+
+
+def is_archived(batch_dir: Path) -> bool:
+    return _read_marker(Path(batch_dir)) is not None
+
+
+def reopen_batch(batch_dir: Path) -> None:
+    """Mark an archived batch pending again after writing new files into it.
+
+    The pack stays referenced, so archived members remain readable, and the
+    next compaction merges the new files into it.  Hold :func:`batch_lock`.
+    """
+
+    batch_dir = Path(batch_dir)
+    marker = _read_marker(batch_dir)
+    if marker is not None and marker.get("complete"):
+        _replace_json(batch_dir / ARCHIVED_MARKER, {**marker, "complete": False})
+
+
+def finished_batches(runs_root: Path, exclude: Iterable[str] = ()) -> List[Path]:
+    """Batch directories with a ``summary.json`` that are not completely archived."""
+
+    exclude = set(exclude)
+    runs_root = Path(runs_root)
+    if not runs_root.exists():
+        return []
+    return sorted(d for d in runs_root.iterdir() if d.is_dir() and d.name not in exclude and _is_pending(d))
+
+
+class BackgroundCompactor:
+    """Daemon thread that compacts finished batches into the archive tier."""
+
+    def __init__(self, runs_root: Path, archive_dir: Path, exclude: Iterable[str] = (), block_bytes: int = 8 * MB,
+                 interval_s: float = 30.0):
+        self.runs_root = Path(runs_root)
+        self.archive_dir = Path(archive_dir)
+        self.exclude: Set[str] = set(exclude)
+        self.block_bytes = block_bytes
+        self.interval_s = interval_s
+        self.compacted: List[Dict] = []
+        self.errors: List[str] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="batch-compactor", daemon=True)
+
+    def start(self) -> "BackgroundCompactor":
+        self._thread.start()
+        return self
+
+    def nudge(self) -> None:
+        """Ask for a compaction pass now (e.g. when a watermark is hit)."""
+
+        self._wake.set()
+
+    def run_once(self) -> int:
+        done = 0
+        for batch_dir in finished_batches(self.runs_root, self.exclude):
+            if self._stop.is_set():
+                break
+            try:
+                stats = compact_batch(batch_dir, self.archive_dir, self.block_bytes)
+            except (OSError, ValueError) as e:
+                self.errors.append(f"{batch_dir.name}: {e}")
+                self.exclude.add(batch_dir.name)
+                continue
+            if stats is not None:
+                self.compacted.append(stats)
+                done += 1
+        return done
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.run_once()
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+
+    def stop(self) -> None:
+        """Finish the batch in progress and any pending pass, then exit."""
+
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+
+
+def free_bytes(path: Path) -> int:
+    path = Path(path)
+    while not path.exists():
+        path = path.parent
+    return shutil.disk_usage(path).free
+
+
+class DiskWatermark:
+    """Block callers while free space under ``path`` is below ``min_free_bytes``."""
+
+    def __init__(self, path: Path, min_free_bytes: int, on_low: Optional[Callable[[], None]] = None,
+                 poll_s: float = 5.0, timeout_s: float = 3600.0, usage: Callable[[Path], int] = free_bytes):
+        self.path = Path(path)
+        self.min_free_bytes = min_free_bytes
+        self.on_low = on_low
+        self.poll_s = poll_s
+        self.timeout_s = timeout_s
+        self.usage = usage
+        self.throttled_s = 0.0
+
+    def wait(self) -> float:
+        """Return seconds spent throttled; raise ``SystemExit`` on timeout."""
+
+        start = time.perf_counter()
+        while self.usage(self.path) < self.min_free_bytes:
+            waited = time.perf_counter() - start
+            if waited >= self.timeout_s:
+                raise SystemExit(
+                    f"[storage_tier] {self.path} below {self.min_free_bytes / GB:.1f} GB free for {waited:.0f}s"
+                )
+            if self.on_low is not None:
+                self.on_low()
+            time.sleep(self.poll_s)
+        waited = time.perf_counter() - start
+        self.throttled_s += waited
+        return waited
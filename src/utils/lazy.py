@@ -0,0 +1,36 @@
+"""
+File: src/utils/lazy.py
+Purpose: Defer heavy imports (torch, faiss, transformers, ...) until first use.
+
+``lazy_import("faiss")`` returns a module proxy.  Nothing is imported until an
+attribute is accessed, so CLI entry points can parse ``--help`` and run the
+light stages (gate, pack, validate, dry-run) without paying for the ML stack.
+The proxy resolves through ``sys.modules`` on every access, which keeps it
+compatible with tests that monkeypatch fake modules in place.
+"""
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Module proxy that imports ``name`` on first attribute access."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_name"] = name
+
+    def _load(self) -> types.ModuleType:
+        return importlib.import_module(self.__dict__["_lazy_name"])
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        return f"<lazy module {self.__dict__['_lazy_name']!r}>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
@@ -4,7 +4,6 @@ Purpose: Validate JSONL file against a JSON schema.
 CLI: python -m src.validate_jsonl --input <file.jsonl> --schema schemas/sft.schema.json
 """
 import argparse, json
-from jsonschema import Draft7Validator
 
 def main():
     ap = argparse.ArgumentParser()
@@ -12,6 +11,8 @@ def main():
     ap.add_argument("--schema", required=True)
     args = ap.parse_args()
 
+    from jsonschema import Draft7Validator
+
     with open(args.schema, "r", encoding="utf-8") as f:
         schema = json.load(f)
     v = Draft7Validator(schema)
@@ -0,0 +1,245 @@
+"""src.vector_store
+==================
+
+Compact, memory-mapped embedding store shared by retrieval workers.
+
+Embeddings are L2-normalised and stored on disk as ``float16`` rows or as
+``int8`` rows with a per-row ``float32`` scale.  Readers map the files
+read-only via :class:`numpy.memmap`, so every debate or audit worker on the
+same machine shares one copy of the matrix through the OS page cache instead
+of holding a private float32 FAISS index.
+
+Layout of a store directory::
+
+    store.json       # {"dtype", "dim", "count", "encoder", "fingerprint"}
+    embeddings.bin   # count x dim rows of dtype
+    scales.bin       # count float32 scales (int8 only)
+
+Rows are appended incrementally and ``store.json`` is rewritten after each
+append, so a reader only ever sees fully written rows.  :meth:`search` mirrors
+``faiss.Index.search`` and can be passed wherever a FAISS index is expected.
+
+(Re)builds hold :func:`build_lock` (``<store>.lock``) and install the result
+with :func:`swap_in`, so workers starting together build the store once.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Tuple
+
+from .utils.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+DTYPES = ("float16", "int8")
+META_FILE = "store.json"
+ROWS_FILE = "embeddings.bin"
+SCALES_FILE = "scales.bin"
+
+# Rows scored per block; bounds the float32 scratch buffer to a few MiB.
+SEARCH_BLOCK_ROWS = 16384
+
+
+def _normalize(x):
+    x = np.asarray(x, dtype=np.float32)
+    if x.ndim == 1:
+        x = x[None, :]
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def _read_meta(path: Path) -> dict:
+    with open(path / META_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_meta(path: Path, meta: dict) -> None:
+    tmp = path / (META_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path / META_FILE)
+
+
+def exists(path: Path) -> bool:
+    return (Path(path) / META_FILE).exists()
+
+
+class EmbeddingStoreWriter:
+    """Append normalised embeddings to a store directory."""
+
+    def __init__(self, path: Path, dim: int, dtype: str = "float16", **extra):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported embedding dtype: {dtype!r} (expected one of {DTYPES})")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        if exists(self.path):
+            self.meta = _read_meta(self.path)
+            if self.meta["dtype"] != dtype or self.meta["dim"] != dim:
+                raise ValueError(f"Existing store at {self.path} has incompatible dtype/dim")
+            self._truncate(self.meta["count"])
+        else:
+            self.meta = {"dtype": dtype, "dim": dim, "count": 0, **extra}
+            for name in (ROWS_FILE, SCALES_FILE):
+                (self.path / name).unlink(missing_ok=True)
+            _write_meta(self.path, self.meta)
+
+    @property
+    def count(self) -> int:
+        return self.meta["count"]
+
+    def _truncate(self, count: int) -> None:
+        """Drop any partially written tail left behind by a crashed writer."""
+
+        itemsize = 2 if self.meta["dtype"] == "float16" else 1
+        rows = self.path / ROWS_FILE
+        if rows.exists():
+            os.truncate(rows, count * self.meta["dim"] * itemsize)
+        scales = self.path / SCALES_FILE
+        if scales.exists():
+            os.truncate(scales, count * 4)
+
+    def append(self, embeddings) -> int:
+        x = _normalize(embeddings)
+        if x.shape[1] != self.meta["dim"]:
+            raise ValueError(f"Expected dim {self.meta['dim']}, got {x.shape[1]}")
+        if self.meta["dtype"] == "float16":
+            return self.append_raw(x.astype(np.float16))
+        scales = np.abs(x).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        rows = np.clip(np.rint(x / scales[:, None]), -127, 127).astype(np.int8)
+        return self.append_raw(rows, scales.astype(np.float32))
+
+    def append_raw(self, rows, scales=None) -> int:
+        """Append rows already in the store's dtype (e.g. copied from another store)."""
+
+        with open(self.path / ROWS_FILE, "ab") as f:
+            f.write(np.ascontiguousarray(rows).tobytes())
+        if scales is not None:
+            with open(self.path / SCALES_FILE, "ab") as f:
+                f.write(np.ascontiguousarray(scales, dtype=np.float32).tobytes())
+        self.meta["count"] += len(rows)
+        _write_meta(self.path, self.meta)
+        return self.meta["count"]
+
+    def update_meta(self, **fields) -> None:
+        self.meta.update(fields)
+        _write_meta(self.path, self.meta)
+
+
+class EmbeddingStore:
+    """Read-only, memory-mapped view over a store directory."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.meta = _read_meta(self.path)
+        self.dim = self.meta["dim"]
+        self.ntotal = self.meta["count"]
+        self.dtype = self.meta["dtype"]
+        if self.ntotal:
+            self.rows = np.memmap(
+                self.path / ROWS_FILE, dtype=self.dtype, mode="r", shape=(self.ntotal, self.dim)
+            )
+            self.scales = (
+                np.memmap(self.path / SCALES_FILE, dtype=np.float32, mode="r", shape=(self.ntotal,))
+                if self.dtype == "int8"
+                else None
+            )
+        else:
+            self.rows = np.zeros((0, self.dim), dtype=self.dtype)
+            self.scales = np.zeros((0,), dtype=np.float32) if self.dtype == "int8" else None
+
+    def __len__(self) -> int:
+        return self.ntotal
+
+    def reconstruct(self, i: int):
+        row = np.asarray(self.rows[i], dtype=np.float32)
+        return row * self.scales[i] if self.scales is not None else row
+
+    def search(self, q_emb, k: int) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Return ``(scores, ids)`` of the top-``k`` rows by inner product.
+
+        Scores are computed block by block directly over the mapped rows; only
+        one block is ever upcast to float32.  Missing results are padded with
+        ``-1`` ids like FAISS does.
+        """
+
+        q = np.asarray(q_emb, dtype=np.float32)
+        if q.ndim == 1:
+            q = q[None, :]
+        nq = q.shape[0]
+        k_eff = min(k, self.ntotal)
+        best_scores = np.full((nq, k), -np.inf, dtype=np.float32)
+        best_ids = np.full((nq, k), -1, dtype=np.int64)
+        if k_eff == 0:
+            return best_scores, best_ids
+
+        for start in range(0, self.ntotal, SEARCH_BLOCK_ROWS):
+            stop = min(start + SEARCH_BLOCK_ROWS, self.ntotal)
+            block = np.asarray(self.rows[start:stop], dtype=np.float32)
+            scores = q @ block.T
+            if self.scales is not None:
+                scores *= self.scales[start:stop][None, :]
+            ids = np.broadcast_to(np.arange(start, stop, dtype=np.int64), scores.shape)
+
+            merged_scores = np.concatenate([best_scores, scores], axis=1)
+            merged_ids = np.concatenate([best_ids, ids], axis=1)
+            top = np.argpartition(-merged_scores, k_eff - 1, axis=1)[:, :k_eff]
+            best_scores[:, :k_eff] = np.take_along_axis(merged_scores, top, axis=1)
+            best_ids[:, :k_eff] = np.take_along_axis(merged_ids, top, axis=1)
+
+        order = np.argsort(-best_scores[:, :k_eff], axis=1)
+        best_scores[:, :k_eff] = np.take_along_axis(best_scores[:, :k_eff], order, axis=1)
+        best_ids[:, :k_eff] = np.take_along_axis(best_ids[:, :k_eff], order, axis=1)
+        return best_scores, best_ids
+
+
+def open_store(path: Path, fingerprint: Optional[str] = None) -> Optional[EmbeddingStore]:
+    """Map the store at ``path`` or return ``None`` if missing or stale."""
+
+    path = Path(path)
+    if not exists(path):
+        return None
+    store = EmbeddingStore(path)
+    if fingerprint is not None and store.meta.get("fingerprint") != fingerprint:
+        return None
+    return store
+
+
+@contextmanager
+def build_lock(path: Path):
+    """Exclusive ``fcntl`` lock on ``<path>.lock`` for building the store at ``path``.
+
+    Callers re-check :func:`open_store` after acquiring it: another process may
+    have finished the build while this one waited.
+    """
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def swap_in(tmp_dir: Path, path: Path) -> None:
+    """Install the finished store at ``tmp_dir`` as ``path`` (under :func:`build_lock`).
+
+    The old store is renamed aside before removal, so readers that still map
+    it keep valid file handles.
+    """
+
+    path = Path(path)
+    old = path.with_name(f"{path.name}.old{os.getpid()}")
+    if path.exists():
+        os.replace(path, old)
+    os.replace(tmp_dir, path)
+    shutil.rmtree(old, ignore_errors=True)
@@ -0,0 +1,38 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+yaml = pytest.importorskip("yaml")
+pytest.importorskip("numpy")
+
+from src import auto_runner
+
+CONFIG = Path(__file__).resolve().parents[1] / "configs" / "default.yaml"
+
+
+def _run(tmp_path, monkeypatch, topics):
+    with open(CONFIG, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    cfg["paths"].update(runs=str(tmp_path / "runs"), datasets=str(tmp_path / "datasets"),
+                        indices=str(tmp_path / "indices"))
+    cfg["storage"].update(archive=str(tmp_path / "archive"), compact_finished=False)
+    (tmp_path / "c.yaml").write_text(yaml.safe_dump(cfg), encoding="utf-8")
+    (tmp_path / "t.yaml").write_text(yaml.safe_dump({"topics": topics}), encoding="utf-8")
+    monkeypatch.setattr(sys, "argv", ["auto_runner", "--config", str(tmp_path / "c.yaml"),
+                                      "--topics", str(tmp_path / "t.yaml"), "--dry-run"])
+    auto_runner.main()
+    with open(tmp_path / "runs" / cfg["batch_id"] / "summary.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_dry_run_summary_counts(tmp_path, monkeypatch):
+    summary = _run(tmp_path, monkeypatch, ["De gratia"])
+    assert summary["counts"]["turns_total"] == summary["counts"]["accepted"] > 0
+
+
+def test_empty_topic_list_writes_zero_summary(tmp_path, monkeypatch):
+    summary = _run(tmp_path, monkeypatch, [])
+    assert summary["counts"] == {"topics": 0, "turns_total": 0, "accepted": 0, "rejected": 0}
+    assert set(summary["kpis"].values()) == {None}
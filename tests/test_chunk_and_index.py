@@ -0,0 +1,92 @@
+import sys
+from types import ModuleType
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src import chunk_and_index, vector_store
+
+
+class LengthEncoder:
+    """Deterministic 4-d embedding derived from the text; counts calls."""
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, show_progress_bar=False):
+        self.batches.append(list(texts))
+        return np.array([[len(t), t.count("a") + 1, t.count("e") + 1, 1.0] for t in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def inline_encoder(monkeypatch):
+    enc = LengthEncoder()
+    fake_torch = ModuleType("torch")
+    fake_torch.get_num_threads = lambda: 1
+    fake_torch.set_num_threads = lambda n: None
+    monkeypatch.setitem(sys.modules, "torch", fake_torch)
+    monkeypatch.setattr(chunk_and_index, "_load_encoder", lambda name, revision="main": enc)
+    return enc
+
+
+ENCODER = "test/length-encoder"  # no query/passage prefixes
+DOCS = ["a" * 5, "e" * 40, "ae" * 3, "aaa eee " * 9, "x", "ea" * 11, "lorem ipsum"]
+
+
+def test_batches_are_length_sorted():
+    order, batches = chunk_and_index._length_sorted_batches(DOCS, 3)
+    lengths = [len(DOCS[i]) for i in order]
+    assert lengths == sorted(lengths, reverse=True)
+    assert [len(b) for b in batches] == [3, 3, 1]
+    _, rest = chunk_and_index._length_sorted_batches(DOCS, 3, skip=4)
+    assert rest == [order[4:7]]
+
+
+def test_store_rows_follow_corpus_order(tmp_path, inline_encoder):
+    stats = chunk_and_index.build_dense_store(DOCS, tmp_path, workers=1, batch_size=3, encoder_name=ENCODER)
+    assert stats["embedded"] == len(DOCS)
+    assert all(len(set(map(len, b))) <= 3 for b in inline_encoder.batches)
+
+    store = vector_store.open_store(tmp_path / "dense")
+    expected = LengthEncoder().encode(DOCS)
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    assert np.asarray(store.rows, dtype=np.float32) == pytest.approx(expected, abs=1e-3)
+    assert not (tmp_path / "dense.partial").exists()
+
+    # Up-to-date store: nothing is re-encoded.
+    inline_encoder.batches.clear()
+    assert chunk_and_index.build_dense_store(DOCS, tmp_path, workers=1, batch_size=3, encoder_name=ENCODER)["embedded"] == 0
+    assert inline_encoder.batches == []
+
+
+def test_rebuild_resumes_from_partial_store(tmp_path, inline_encoder, monkeypatch):
+    calls = {"n": 0}
+    real_embed = chunk_and_index._embed_batch
+
+    def crash_after_first(texts):
+        calls["n"] += 1
+        if calls["n"] == 2:
+            raise RuntimeError("worker died")
+        return real_embed(texts)
+
+    monkeypatch.setattr(chunk_and_index, "_embed_batch", crash_after_first)
+    with pytest.raises(RuntimeError):
+        chunk_and_index.build_dense_store(DOCS, tmp_path, workers=1, batch_size=3, encoder_name=ENCODER)
+    assert vector_store.EmbeddingStore(tmp_path / "dense.partial").ntotal == 3
+
+    monkeypatch.setattr(chunk_and_index, "_embed_batch", real_embed)
+    inline_encoder.batches.clear()
+    stats = chunk_and_index.build_dense_store(DOCS, tmp_path, workers=1, batch_size=3, encoder_name=ENCODER)
+    assert stats["embedded"] == len(DOCS) - 3
+    assert sum(len(b) for b in inline_encoder.batches) == len(DOCS) - 3
+    assert len(vector_store.open_store(tmp_path / "dense")) == len(DOCS)
+
+
+def test_default_workers_are_bounded_by_cores_and_ram():
+    gb = 1024**3
+    assert chunk_and_index.default_workers(1, 0) == 1
+    assert chunk_and_index.default_workers(16, 64 * gb) == 4
+    assert chunk_and_index.default_workers(128, 512 * gb) == 8
+    assert chunk_and_index.default_workers(128, 5 * gb, worker_ram=2 * gb) == 2
+    assert chunk_and_index.default_workers(64, gb // 2) == 1
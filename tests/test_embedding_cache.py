@@ -0,0 +1,142 @@
+import shutil
+import sys
+from types import ModuleType
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src import chunk_and_index, embedding_cache, vector_store
+from src.embedding_cache import CachedEncoder, EmbeddingCache, prefixes, text_key
+
+
+class CountingModel:
+    def __init__(self, dim=4):
+        self.dim = dim
+        self.encoded = []
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False):
+        self.encoded.extend(texts)
+        return np.array([[len(t) + j for j in range(self.dim)] for t in texts], dtype=np.float32) / 7
+
+
+def test_put_get_round_trip(tmp_path):
+    cache = EmbeddingCache(tmp_path, "org/enc", "r1")
+    keys = [text_key(t) for t in ("alpha", "beta")]
+    cache.put_many(keys, np.array([[1, 2, 3], [4, 5, 6]], dtype=np.float32))
+
+    vectors, rows = EmbeddingCache(tmp_path, "org/enc", "r1").get_many([keys[1], text_key("gamma"), keys[0]])
+    assert rows.tolist() == [1, -1, 0]
+    assert vectors.tolist() == [[4, 5, 6], [0, 0, 0], [1, 2, 3]]
+
+
+def test_entries_are_scoped_to_encoder_and_revision(tmp_path):
+    key = [text_key("alpha")]
+    EmbeddingCache(tmp_path, "org/enc", "r1").put_many(key, np.ones((1, 3)))
+    assert EmbeddingCache(tmp_path, "org/enc", "r2").rows(key).tolist() == [-1]
+    assert EmbeddingCache(tmp_path, "org/other", "r1").rows(key).tolist() == [-1]
+    assert EmbeddingCache(tmp_path, "org/enc", "r1").rows(key).tolist() == [0]
+
+    with pytest.raises(ValueError):
+        EmbeddingCache(tmp_path, "org/enc", "r1").put_many([text_key("beta")], np.ones((1, 5)))
+
+
+def test_rows_from_other_writers_are_picked_up(tmp_path):
+    reader = EmbeddingCache(tmp_path, "enc")
+    writer = EmbeddingCache(tmp_path, "enc")
+    writer.put_many([text_key("a")], np.ones((1, 2)))
+    reader.put_many([text_key("b")], np.full((1, 2), 2.0))
+    writer.put_many([text_key("c")], np.full((1, 2), 3.0))
+
+    vectors, rows = reader.get_many([text_key(t) for t in "abc"])
+    assert rows.tolist() == [0, 1, 2]
+    assert vectors[:, 0].tolist() == [1.0, 2.0, 3.0]
+
+
+def test_refresh_reads_only_the_appended_tail(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "MERGE_MIN_ROWS", 4)
+    reader = EmbeddingCache(tmp_path, "enc")
+    writer = EmbeddingCache(tmp_path, "enc")
+    monkeypatch.setattr(EmbeddingCache, "_load", lambda self: pytest.fail("full reload"))
+    keys = [text_key(str(i)) for i in range(9)] + [b"\x01" * 19 + b"\x00"]
+    for i, key in enumerate(keys):
+        writer.put_many([key], np.full((1, 2), float(i)))
+        reader.refresh()
+        assert len(reader) == i + 1
+
+    assert len(reader._recent) <= 4  # folded into the sorted keys as it grows
+    vectors, rows = reader.get_many(keys[::-1])
+    assert rows.tolist() == list(range(10))[::-1]
+    assert vectors[:, 0].tolist() == [float(i) for i in range(10)][::-1]
+
+
+def test_torn_tail_is_dropped_on_append(tmp_path):
+    cache = EmbeddingCache(tmp_path, "enc")
+    cache.put_many([text_key("a")], np.ones((1, 2)))
+    with open(cache.path / "vectors.bin", "ab") as f:
+        f.write(b"\x00\x01\x02")
+    cache.put_many([text_key("b")], np.full((1, 2), 2.0))
+    vectors, rows = EmbeddingCache(tmp_path, "enc").get_many([text_key("b")])
+    assert rows.tolist() == [1] and vectors.tolist() == [[2.0, 2.0]]
+
+
+def test_cached_encoder_encodes_each_text_once(tmp_path):
+    model = CountingModel()
+    enc = CachedEncoder("org/enc", cache=EmbeddingCache(tmp_path, "org/enc"), load=lambda: model)
+    first = enc.encode(["alpha", "beta", "alpha"])
+    assert model.encoded == ["alpha", "beta"]
+
+    loads = []
+    again = CachedEncoder("org/enc", cache=EmbeddingCache(tmp_path, "org/enc"), load=lambda: loads.append(1))
+    assert again.encode(["beta", "alpha"]).tolist() == first[[1, 0]].tolist()
+    assert loads == []  # fully cached: the model is never loaded
+
+    enc.encode(["gamma", "alpha"])
+    assert model.encoded == ["alpha", "beta", "gamma"]
+    assert enc.cache.stats == {"hits": 1, "misses": 4, "added": 3}
+
+
+def test_queries_are_not_persisted(tmp_path):
+    model = CountingModel()
+    enc = CachedEncoder("intfloat/multilingual-e5-base", cache=EmbeddingCache(tmp_path, "e5"), load=lambda: model)
+    enc.encode_queries(["de gratia", "de gratia et libero arbitrio"])
+    assert model.encoded == ["query: de gratia", "query: de gratia et libero arbitrio"]
+    assert len(enc.cache) == 0 and not (enc.cache.path / "keys.bin").exists()
+
+
+def test_e5_prefixes():
+    assert prefixes("intfloat/multilingual-e5-base") == ("query: ", "passage: ")
+    assert prefixes("sentence-transformers/all-MiniLM-L6-v2") == ("", "")
+
+
+@pytest.fixture
+def inline_model(monkeypatch):
+    model = CountingModel()
+    fake_torch = ModuleType("torch")
+    fake_torch.get_num_threads = lambda: 1
+    fake_torch.set_num_threads = lambda n: None
+    monkeypatch.setitem(sys.modules, "torch", fake_torch)
+    monkeypatch.setattr(chunk_and_index, "_load_encoder", lambda name, revision="main": model)
+    return model
+
+
+DOCS = ["a" * 5, "e" * 40, "ae" * 3, "x", "lorem ipsum"]
+
+
+def test_index_rebuild_reads_from_cache(tmp_path, inline_model):
+    cache = EmbeddingCache(tmp_path / "cache", "intfloat/multilingual-e5-base")
+    stats = chunk_and_index.build_dense_store(
+        DOCS, tmp_path, workers=1, batch_size=2, encoder_name="intfloat/multilingual-e5-base", cache=cache
+    )
+    assert stats["embedded"] == len(DOCS) and stats["cached"] == 0
+    assert sorted(inline_model.encoded) == sorted("passage: " + d for d in DOCS)
+    rows = np.asarray(vector_store.open_store(tmp_path / "dense").rows, dtype=np.float32)
+
+    shutil.rmtree(tmp_path / "dense")
+    inline_model.encoded.clear()
+    stats = chunk_and_index.build_dense_store(
+        DOCS, tmp_path, workers=1, batch_size=2, encoder_name="intfloat/multilingual-e5-base", cache=cache
+    )
+    assert stats["embedded"] == 0 and stats["cached"] == len(DOCS)
+    assert inline_model.encoded == []
+    assert np.asarray(vector_store.open_store(tmp_path / "dense").rows, dtype=np.float32).tolist() == rows.tolist()
@@ -0,0 +1,89 @@
+import sys
+from types import ModuleType, SimpleNamespace
+
+import pytest
+
+from src import debate_loop
+
+
+def test_cpu_options_use_bf16_and_dynamic_int8():
+    resolve = debate_loop._resolve_load_options
+    assert resolve({"dtype": "fp16"}, cuda_available=False)["dtype"] == "bf16"
+    opts = resolve({"dtype": "fp16", "quant_4bit": True, "threads": 8}, cuda_available=False)
+    assert opts == {"device": "cpu", "dtype": "fp32", "quant": "int8_dynamic", "threads": 8, "mode": "cpu-int8_dynamic"}
+    assert resolve({"quant_int8": True}, cuda_available=False)["quant"] == "int8_dynamic"
+    assert resolve(None, cuda_available=False)["mode"] == "cpu-fp32"
+
+
+def test_cuda_options_keep_bitsandbytes():
+    resolve = debate_loop._resolve_load_options
+    assert resolve({"dtype": "fp16", "quant_4bit": True}, cuda_available=True)["mode"] == "cuda-4bit"
+    assert resolve({"dtype": "fp16"}, cuda_available=True)["mode"] == "cuda-fp16"
+    assert resolve({"device": "cpu", "dtype": "bf16"}, cuda_available=True)["mode"] == "cpu-bf16"
+
+
+def test_unknown_dtype_is_rejected():
+    with pytest.raises(ValueError):
+        debate_loop._resolve_load_options({"dtype": "int4"}, cuda_available=False)
+
+
+class FakeLinear:
+    pass
+
+
+class FakeModel:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.evaluated = False
+
+    def eval(self):
+        self.evaluated = True
+
+    def modules(self):
+        return [self, FakeLinear(), FakeLinear(), object()]
+
+
+@pytest.fixture
+def fake_stack(monkeypatch):
+    calls = {}
+    torch = ModuleType("torch")
+    torch.float32, torch.bfloat16, torch.float16, torch.qint8 = "float32", "bfloat16", "float16", "qint8"
+    torch.cuda = SimpleNamespace(is_available=lambda: False)
+    torch.nn = SimpleNamespace(Linear=FakeLinear)
+    torch.set_num_threads = lambda n: calls.setdefault("threads", n)
+
+    def quantize_dynamic(model, layers, dtype):
+        calls["quantized"] = (layers, dtype)
+        return model
+
+    torch.quantization = SimpleNamespace(quantize_dynamic=quantize_dynamic)
+
+    transformers = ModuleType("transformers")
+    transformers.AutoTokenizer = SimpleNamespace(from_pretrained=lambda name: f"tok:{name}")
+
+    def from_pretrained(name, **kwargs):
+        if name != "sshleifer/tiny-gpt2":
+            raise OSError("not cached")
+        return FakeModel(**kwargs)
+
+    transformers.AutoModelForCausalLM = SimpleNamespace(from_pretrained=from_pretrained)
+    monkeypatch.setitem(sys.modules, "torch", torch)
+    monkeypatch.setitem(sys.modules, "transformers", transformers)
+    return calls
+
+
+def test_load_model_quantizes_linear_layers_on_cpu(fake_stack):
+    tok, model, used, report = debate_loop._load_model("missing/model", {"quant_4bit": True, "threads": 4})
+    assert used == "sshleifer/tiny-gpt2" and tok == "tok:sshleifer/tiny-gpt2"
+    assert model.evaluated and model.kwargs == {"torch_dtype": "float32"}
+    assert fake_stack == {"threads": 4, "quantized": ({FakeLinear}, "qint8")}
+    assert report["mode"] == "cpu-int8_dynamic"
+    assert report["quantized_linear"] == 2
+    assert report["load_s"] >= 0 and report["rss_mb"] > 0
+
+
+def test_load_model_bf16_on_cpu(fake_stack):
+    _, model, _, report = debate_loop._load_model("missing/model", {"dtype": "fp16"})
+    assert model.kwargs == {"torch_dtype": "bfloat16"}
+    assert report["mode"] == "cpu-bf16" and report["quantized_linear"] == 0
+    assert fake_stack == {}
@@ -0,0 +1,89 @@
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.metrics_store import KPI_NAMES, MetricsStore, batch_kpis, empty_kpis, new_run_id
+
+
+def _gate_rows(batch, run, support, passed, novelty=0.5):
+    return [
+        {
+            "batch_id": batch,
+            "run": run,
+            "stage": "gate",
+            "speaker": "Aquinas",
+            "topic": "De gratia",
+            "words": 150,
+            "citations": 1 + i % 2,
+            "support_rate": s,
+            "latin_score": 0.3,
+            "novelty": novelty,
+            "passed": p,
+        }
+        for i, (s, p) in enumerate(zip(support, passed))
+    ]
+
+
+def test_kpis_per_batch(tmp_path):
+    store = MetricsStore(tmp_path)
+    store.append(_gate_rows("b1", new_run_id("gate"), [0.9, 0.7], [True, False]))
+    store.append(_gate_rows("b2", new_run_id("gate"), [1.0], [True], novelty=0.2))
+    store.append([{"batch_id": "b1", "run": new_run_id("debate"), "stage": "debate", "words": 999}])
+
+    kpis = batch_kpis(store)
+    assert kpis["b1"]["counts"] == {"turns": 2, "accepted": 1, "rejected": 1}
+    assert kpis["b1"]["kpis"]["support_rate_avg"] == pytest.approx(0.8)
+    assert kpis["b1"]["kpis"]["citations_avg"] == pytest.approx(1.5)
+    assert kpis["b1"]["kpis"]["words_avg"] == pytest.approx(150)  # debate rows excluded
+    assert kpis["b2"]["kpis"]["novelty_max"] == pytest.approx(0.2)
+
+
+def test_rerun_replaces_previous_gate_run(tmp_path):
+    store = MetricsStore(tmp_path)
+    store.append(_gate_rows("b1", new_run_id("gate"), [0.1, 0.1, 0.1], [False] * 3))
+    store.append(_gate_rows("b1", new_run_id("gate"), [0.9, 0.9], [True, True]))
+
+    kpis = batch_kpis(store)["b1"]
+    assert kpis["counts"]["turns"] == 2
+    assert kpis["kpis"]["support_rate_avg"] == pytest.approx(0.9)
+
+
+def test_missing_metrics_are_null(tmp_path):
+    store = MetricsStore(tmp_path)
+    store.append([{"batch_id": "b1", "run": "gate:1", "stage": "gate", "passed": True}])
+    assert math.isnan(store.column("support_rate")[0])
+    kpis = batch_kpis(store)["b1"]["kpis"]
+    assert kpis["support_rate_avg"] is None
+    assert kpis["citations_avg"] is None
+
+
+def test_torn_append_is_discarded(tmp_path):
+    store = MetricsStore(tmp_path)
+    store.append(_gate_rows("b1", "gate:1", [0.5], [True]))
+    with open(tmp_path / "words.bin", "ab") as f:
+        f.write(b"\x01\x02")  # crashed writer left a partial value
+    store.append(_gate_rows("b1", "gate:1", [0.7], [True]))
+    assert list(store.column("words")) == [150, 150]
+    assert batch_kpis(store)["b1"]["kpis"]["support_rate_avg"] == pytest.approx(0.6)
+
+
+def test_values_are_coerced_to_column_types(tmp_path):
+    store = MetricsStore(tmp_path)
+    store.append([{"batch_id": "b1", "run": "gate:1", "stage": "gate", "words": 150.0, "citations": "2",
+                   "support_rate": 1, "passed": True}])
+    assert list(store.column("words")) == [150] and list(store.column("citations")) == [2]
+    assert batch_kpis(store)["b1"]["kpis"]["support_rate_avg"] == pytest.approx(1.0)
+
+    with pytest.raises(ValueError, match="words"):
+        store.append([{"batch_id": "b1", "run": "gate:2", "stage": "gate", "words": "many"}])
+    assert store.count() == 1
+    assert (tmp_path / "batch_id.bin").stat().st_size == 4  # nothing written for the bad row
+
+
+def test_empty_kpis_match_batch_kpis_shape(tmp_path):
+    store = MetricsStore(tmp_path)
+    store.append(_gate_rows("b1", "gate:1", [0.5], [True]))
+    assert set(empty_kpis()["kpis"]) == set(batch_kpis(store)["b1"]["kpis"]) == set(KPI_NAMES)
+    assert empty_kpis()["counts"] == {"turns": 0, "accepted": 0, "rejected": 0}
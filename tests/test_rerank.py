@@ -0,0 +1,68 @@
+from src.rerank import CrossEncoderReranker, PairScoreCache
+
+
+class FakeCrossEncoder:
+    """Scores a pair by how many query words occur in the passage."""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.batches.append(list(pairs))
+        return [sum(w in p.split() for w in q.split()) + len(p) / 1000 for q, p in pairs]
+
+
+def _cands(texts):
+    return [{"source": f"doc_{i}", "text": t, "score": 0.0} for i, t in enumerate(texts)]
+
+
+TEXTS = ["gratia naturam perficit", "anima forma corporis", "gratia et anima", "virtus habitus"]
+
+
+def test_rerank_orders_by_cross_encoder_score():
+    model = FakeCrossEncoder()
+    rr = CrossEncoderReranker(model=model, batch_size=2)
+    top = rr.rerank("gratia anima", _cands(TEXTS), k=2)
+    assert [c["source"] for c in top] == ["doc_2", "doc_0"]
+    assert top[0]["rerank_score"] > top[1]["rerank_score"]
+    # 4 pairs in batches of 2, shortest pairs first
+    assert [len(b) for b in model.batches] == [2, 2]
+    lengths = [len(p) for b in model.batches for _, p in b]
+    assert lengths == sorted(lengths)
+
+
+def test_pair_scores_persist_across_rerankers(tmp_path):
+    path = tmp_path / "rerank.sqlite"
+    first = FakeCrossEncoder()
+    CrossEncoderReranker("m", cache=PairScoreCache(path, "m"), model=first).rerank("gratia", _cands(TEXTS), k=3)
+
+    second = FakeCrossEncoder()
+    rr = CrossEncoderReranker("m", cache=PairScoreCache(path, "m"), model=second)
+    top = rr.rerank("gratia", _cands(TEXTS[::-1]), k=3)
+    assert second.batches == []
+    assert rr.stats["cache_hits"] == 4
+    assert top[0]["text"] in {"gratia naturam perficit", "gratia et anima"}
+
+    # A different model name does not reuse those scores.
+    other = FakeCrossEncoder()
+    CrossEncoderReranker("m2", cache=PairScoreCache(path, "m2"), model=other).rerank("gratia", _cands(TEXTS), k=1)
+    assert sum(len(b) for b in other.batches) == 4
+
+
+def test_rerank_many_shares_batches_across_queries():
+    model = FakeCrossEncoder()
+    rr = CrossEncoderReranker(model=model, batch_size=64)
+    out = rr.rerank_many(["gratia", "anima"], [_cands(TEXTS), _cands(TEXTS)], k=1)
+    assert len(model.batches) == 1 and len(model.batches[0]) == 8
+    assert out[1][0]["text"] in {"anima forma corporis", "gratia et anima"}
+    assert rr.stats["queries"] == 2
+    assert rr.latency_ms() >= 0.0
+
+
+def test_hybrid_search_reranks_fused_pool(hybrid_env):
+    search, docs, bm25, encoder, index = hybrid_env
+    rr = CrossEncoderReranker(model=FakeCrossEncoder())
+    results = search("alpha beta", docs, bm25, encoder, index, k=1, bm25_k=3, dense_k=3, reranker=rr)
+    # RRF alone would pick doc_2; the cross-encoder prefers the passage matching both words
+    assert [r["source"] for r in results] == ["doc_0"]
+    assert rr.stats["pairs"] == 3
@@ -0,0 +1,126 @@
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from src.retrieval_service import MicroBatcher, RetrievalClient, serve
+
+
+class RecordingSearch:
+    def __init__(self, delay=0.0):
+        self.batches = []
+        self.delay = delay
+
+    def __call__(self, queries, k):
+        self.batches.append(list(queries))
+        time.sleep(self.delay)
+        return [[{"source": f"{q}:{i}", "text": q, "score": 1.0 / (i + 1)} for i in range(k)] for q in queries]
+
+
+@pytest.fixture
+def unix_service():
+    search = RecordingSearch(delay=0.01)
+    batcher = MicroBatcher(search, max_batch=16, max_wait_ms=50)
+    sock = str(Path(tempfile.mkdtemp(dir="/tmp")) / "r.sock")
+    server = serve(batcher, socket_path=sock)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield search, sock
+    server.shutdown()
+    server.server_close()
+    batcher.close()
+
+
+def test_concurrent_requests_are_coalesced(unix_service):
+    search, sock = unix_service
+    results = {}
+
+    def worker(i):
+        client = RetrievalClient(socket_path=sock)
+        results[i] = client.search(f"q{i}", k=2)
+        client.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert {i: [r["source"] for r in res] for i, res in results.items()} == {
+        i: [f"q{i}:0", f"q{i}:1"] for i in range(12)
+    }
+    assert len(search.batches) < 12
+    assert sum(len(b) for b in search.batches) == 12
+
+    stats = RetrievalClient(socket_path=sock).stats()
+    assert stats["requests"] == 12
+    assert stats["mean_batch_size"] > 1
+    assert stats["max_latency_ms"] >= stats["mean_latency_ms"] > 0
+
+
+def test_requests_with_different_k_are_split():
+    search = RecordingSearch()
+    batcher = MicroBatcher(search, max_batch=8, max_wait_ms=50)
+    out = {}
+    threads = [
+        threading.Thread(target=lambda i=i: out.__setitem__(i, batcher.search(f"q{i}", k=1 + i % 2)))
+        for i in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.close()
+    assert [len(out[i]) for i in range(4)] == [1, 2, 1, 2]
+
+
+def test_tcp_mode_and_errors_reach_client():
+    def failing(queries, k):
+        raise ValueError("index missing")
+
+    batcher = MicroBatcher(failing, max_wait_ms=1)
+    server = serve(batcher, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = RetrievalClient(port=server.server_address[1])
+        with pytest.raises(RuntimeError, match="index missing"):
+            client.search("q")
+        assert client.stats()["requests"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+
+
+class WordOverlapModel:
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        return [sum(w in p.split() for w in q.split()) for q, p in pairs]
+
+
+def test_service_reranks_on_batcher_thread(tmp_path):
+    from src.rerank import CrossEncoderReranker, PairScoreCache
+
+    # Built in this thread, used on the batcher thread, as in main()
+    reranker = CrossEncoderReranker("m", cache=PairScoreCache(tmp_path / "rerank.sqlite", "m"), model=WordOverlapModel())
+    texts = ["gratia naturam perficit", "anima forma corporis", "gratia et anima"]
+
+    def search_batch(queries, k):
+        pools = [[{"source": f"doc_{i}", "text": t, "score": 0.0} for i, t in enumerate(texts)] for _ in queries]
+        return reranker.rerank_many(list(queries), pools, k)
+
+    batcher = MicroBatcher(search_batch, max_wait_ms=1, reranker=reranker)
+    server = serve(batcher, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = RetrievalClient(port=server.server_address[1])
+        assert [r["source"] for r in client.search("gratia anima", k=1)] == ["doc_2"]
+        assert [r["source"] for r in client.search("gratia anima", k=1)] == ["doc_2"]
+        stats = client.stats()["rerank"]
+        assert stats["queries"] == 2 and stats["scored"] == 3 and stats["cache_hits"] == 3
+        assert stats["latency_ms"] > 0
+    finally:
+        server.shutdown()
+        server.server_close()
+        batcher.close()
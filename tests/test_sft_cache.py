@@ -0,0 +1,100 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "training"))
+import sft_cache  # noqa: E402
+
+EOS = 1
+
+
+class WordTokenizer:
+    """Whitespace tokenizer with a growing vocabulary (ids start at 2)."""
+
+    def __init__(self):
+        self.vocab = {}
+
+    def encode(self, text):
+        return [self.vocab.setdefault(w, len(self.vocab) + 2) for w in text.split()]
+
+
+@pytest.fixture
+def sft_shard(tmp_path):
+    path = tmp_path / "shard.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for i, n in enumerate([3, 9, 5, 2, 7, 4]):
+            rec = {"instruction": f"quaestio {i}", "response": " ".join(["verbum"] * n)}
+            f.write(json.dumps(rec) + "\n")
+    return path
+
+
+def test_pack_lengths_respects_capacity():
+    lengths = [7, 5, 4, 4, 3, 2, 1]
+    bins = sft_cache.pack_lengths(lengths, 8)
+    assert sorted(i for b in bins for i in b) == list(range(len(lengths)))
+    assert all(sum(lengths[i] for i in b) <= 8 for b in bins)
+    assert len(bins) == 4  # sum = 26 -> at least 4 bins of 8
+
+
+def test_packed_rows_keep_example_boundaries(sft_shard, tmp_path):
+    tok = WordTokenizer()
+    meta = sft_cache.build_cache(sft_shard, tmp_path / "cache", tok.encode, EOS, max_seq_len=16)
+    assert meta["examples"] == 6
+    assert meta["packs"] < meta["examples"]
+    assert meta["padding_waste"] < meta["padding_waste_unpacked"]
+
+    ds = sft_cache.PackedDataset(tmp_path / "cache")
+    assert isinstance(ds.tokens, np.memmap)
+    rows = list(ds)
+    assert len(rows) == meta["packs"]
+    assert sum(int(r["attention_mask"].sum()) for r in rows) == meta["tokens"]
+
+    for row in rows:
+        start = 0
+        for n in row["seq_lens"]:
+            seg = slice(start, start + n)
+            assert list(row["position_ids"][seg]) == list(range(n))
+            # prompt tokens ("quaestio", "<i>") are masked, EOS closes the example
+            assert list(row["labels"][seg][:2]) == [sft_cache.IGNORE_INDEX] * 2
+            assert row["input_ids"][start + n - 1] == EOS
+            assert row["labels"][start + n - 1] == EOS
+            start += n
+        assert (row["labels"][start:] == sft_cache.IGNORE_INDEX).all()
+
+        mask = sft_cache.block_causal_mask(row["seq_lens"], 16)
+        if len(row["seq_lens"]) > 1:
+            first = row["seq_lens"][0]
+            assert not mask[first, first - 1]  # second example can't see the first
+            assert mask[first, first]
+
+
+def test_cache_is_reused_until_source_changes(sft_shard, tmp_path):
+    calls = []
+
+    def encode(text):
+        calls.append(text)
+        return WordTokenizer().encode(text)
+
+    sft_cache.build_cache(sft_shard, tmp_path / "cache", encode, EOS, max_seq_len=16)
+    n = len(calls)
+    sft_cache.build_cache(sft_shard, tmp_path / "cache", encode, EOS, max_seq_len=16)
+    assert len(calls) == n
+
+    with open(sft_shard, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"instruction": "nova", "response": "responsio"}) + "\n")
+    meta = sft_cache.build_cache(sft_shard, tmp_path / "cache", encode, EOS, max_seq_len=16)
+    assert meta["examples"] == 7
+    assert len(calls) > n
+
+
+def test_unpacked_cache_has_one_example_per_row(sft_shard, tmp_path):
+    meta = sft_cache.build_cache(
+        sft_shard, tmp_path / "cache", WordTokenizer().encode, EOS, max_seq_len=16, pack=False
+    )
+    assert meta["packs"] == meta["examples"]
+    batches = list(sft_cache.iter_batches(sft_cache.PackedDataset(tmp_path / "cache"), 4))
+    assert [b["input_ids"].shape for b in batches] == [(4, 16), (2, 16)]
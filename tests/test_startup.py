@@ -0,0 +1,60 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+# Wall-clock budget for ``python -m <entry> --help`` including interpreter
+# startup.  Light stages must never import the ML stack.
+STARTUP_BUDGET_S = 1.0
+
+ENTRY_POINTS = [
+    "src.auto_runner",
+    "src.chunk_and_index",
+    "src.corpus",
+    "src.debate_loop",
+    "src.audit_loop",
+    "src.quality_gate",
+    "src.pack_sft",
+    "src.pack_dpo",
+    "src.validate_jsonl",
+    "src.metrics_store",
+    "src.retrieval_service",
+    "src.load_bench",
+]
+
+HEAVY_MODULES = ["torch", "faiss", "transformers", "sentence_transformers", "rank_bm25"]
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_entry_point_help_within_budget(module):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", module, "--help"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert elapsed < STARTUP_BUDGET_S, f"{module} took {elapsed:.2f}s to start"
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_entry_point_import_is_light(module):
+    code = (
+        "import importlib, sys\n"
+        f"importlib.import_module({module!r})\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert result.stdout.strip() == "", f"{module} imported {result.stdout.strip()}"
@@ -0,0 +1,188 @@
+import json
+import time
+from pathlib import Path
+
+import pytest
+
+from src.storage_tier import (
+    ARCHIVED_MARKER,
+    BackgroundCompactor,
+    LOCK_FILE,
+    DiskWatermark,
+    PackReader,
+    batch_lock,
+    compact_batch,
+    finished_batches,
+    publish,
+)
+
+
+def _make_batch(root, name, finished=True, turns=5):
+    d = root / name
+    (d / "generated").mkdir(parents=True)
+    for i in range(turns):
+        (d / "generated" / f"turn_{i}.json").write_text(json.dumps({"i": i, "text": "verba " * 50}))
+    (d / "audit.log").write_text("x" * 3000)
+    if finished:
+        (d / "summary.json").write_text(json.dumps({"batch_id": name}))
+    return d
+
+
+def test_compact_batch_round_trip(tmp_path):
+    batch = _make_batch(tmp_path / "runs", "b1")
+    originals = {
+        p.relative_to(batch).as_posix(): p.read_bytes() for p in batch.rglob("*") if p.is_file()
+    }
+    stats = compact_batch(batch, tmp_path / "archive", block_bytes=1024)
+
+    assert stats["files"] == 6
+    assert stats["blocks"] > 1
+    assert stats["packed_bytes"] < stats["raw_bytes"]
+    assert sorted(p.name for p in batch.iterdir()) == [LOCK_FILE, ARCHIVED_MARKER, "summary.json"]
+
+    reader = PackReader(tmp_path / "archive" / "b1.pack")
+    assert sorted(reader.names()) == sorted(n for n in originals if n != "summary.json")
+    for name in reader.names():
+        assert reader.read(name) == originals[name]
+    assert reader.read_json("generated/turn_3.json")["i"] == 3
+
+
+def test_interrupted_removal_keeps_every_member(tmp_path, monkeypatch):
+    batch = _make_batch(tmp_path / "runs", "b1", turns=3)
+    originals = {p.relative_to(batch).as_posix(): p.read_bytes() for p in batch.rglob("*") if p.is_file()}
+    del originals["summary.json"]
+    real_unlink = Path.unlink
+    deleted = []
+
+    def flaky_unlink(self, *args, **kwargs):
+        if deleted:
+            raise OSError("disk went away")
+        deleted.append(self)
+        real_unlink(self, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "unlink", flaky_unlink)
+    with pytest.raises(OSError):
+        compact_batch(batch, tmp_path / "archive")
+    monkeypatch.setattr(Path, "unlink", real_unlink)
+    assert json.loads((batch / ARCHIVED_MARKER).read_text())["complete"] is False
+    assert [d.name for d in finished_batches(tmp_path / "runs")] == ["b1"]
+
+    stats = compact_batch(batch, tmp_path / "archive")
+    assert stats["complete"] and stats["files"] == len(originals) == 4
+    reader = PackReader(tmp_path / "archive" / "b1.pack")
+    assert {n: reader.read(n) for n in reader.names()} == originals
+    assert finished_batches(tmp_path / "runs") == []
+
+
+def test_rerun_merges_into_existing_pack(tmp_path):
+    batch = _make_batch(tmp_path / "runs", "b1", turns=2)
+    compact_batch(batch, tmp_path / "archive")
+    (batch / ARCHIVED_MARKER).unlink()
+    (batch / "generated").mkdir()
+    (batch / "generated" / "turn_1.json").write_text("rewritten")
+    (batch / "generated" / "turn_9.json").write_text("new")
+
+    stats = compact_batch(batch, tmp_path / "archive")
+    assert stats["merged"] == 2
+    reader = PackReader(tmp_path / "archive" / "b1.pack")
+    assert sorted(reader.names()) == ["audit.log", "generated/turn_0.json", "generated/turn_1.json", "generated/turn_9.json"]
+    assert reader.read("generated/turn_1.json") == b"rewritten"
+    assert reader.read_json("generated/turn_0.json")["i"] == 0
+
+
+def test_locked_batch_is_not_compacted(tmp_path):
+    batch = _make_batch(tmp_path / "runs", "b1")
+    compactor = BackgroundCompactor(tmp_path / "runs", tmp_path / "archive")
+    with batch_lock(batch):
+        assert compact_batch(batch, tmp_path / "archive") is None
+        assert compactor.run_once() == 0
+    assert compactor.run_once() == 1
+    assert compactor.errors == []
+
+
+def test_compactor_skips_current_and_unfinished(tmp_path):
+    runs = tmp_path / "runs"
+    _make_batch(runs, "old")
+    _make_batch(runs, "current")
+    _make_batch(runs, "running", finished=False)
+
+    assert [d.name for d in finished_batches(runs, exclude={"current"})] == ["old"]
+    compactor = BackgroundCompactor(runs, tmp_path / "archive", exclude={"current"})
+    assert compactor.run_once() == 1
+    assert compactor.run_once() == 0
+    assert (runs / "old" / ARCHIVED_MARKER).exists()
+    assert (runs / "current" / "generated").exists()
+    assert (tmp_path / "archive" / "old.pack").exists()
+
+
+def test_background_compactor_thread(tmp_path):
+    runs = tmp_path / "runs"
+    _make_batch(runs, "a")
+    compactor = BackgroundCompactor(runs, tmp_path / "archive", interval_s=60).start()
+    deadline = time.time() + 5
+    while not compactor.compacted and time.time() < deadline:
+        time.sleep(0.01)
+    compactor.stop()
+    assert [c["pack"].endswith("a.pack") for c in compactor.compacted] == [True]
+    assert compactor.errors == []
+
+
+def test_publish_is_atomic_copy(tmp_path):
+    src = tmp_path / "ssd" / "shard.jsonl"
+    src.parent.mkdir()
+    src.write_text("".join(json.dumps({"i": i}) + "\n" for i in range(1000)))
+    dest = publish(src, tmp_path / "hdd" / "sft" / "shard.jsonl", block_bytes=4096)
+    assert dest.read_bytes() == src.read_bytes()
+    assert not dest.with_name(dest.name + ".tmp").exists()
+
+
+def test_watermark_throttles_until_space_is_freed(tmp_path):
+    free = [10, 10, 100]
+    nudges = []
+    wm = DiskWatermark(tmp_path, 50, on_low=lambda: nudges.append(1), poll_s=0, usage=lambda p: free.pop(0))
+    wm.wait()
+    assert len(nudges) == 2
+    assert wm.throttled_s >= 0
+
+
+def test_watermark_times_out(tmp_path):
+    wm = DiskWatermark(tmp_path, 50, poll_s=0, timeout_s=0, usage=lambda p: 0)
+    with pytest.raises(SystemExit):
+        wm.wait()
+
+
+def test_gate_and_pack_read_archived_batch(tmp_path, monkeypatch):
+    import sys
+
+    yaml = pytest.importorskip("yaml")
+    from src import pack_dpo, pack_sft, quality_gate
+
+    monkeypatch.chdir(tmp_path)
+    batch = tmp_path / "runs" / "b1"
+    (batch / "audits").mkdir(parents=True)
+    for i, words in enumerate([150, 150.0, 10]):  # the last one fails the gate
+        metrics = {"words": words, "citations": 1, "support_rate": 0.9, "latin_score": 0.5, "novelty": 0.1}
+        (batch / "audits" / f"t{i}.json").write_text(
+            json.dumps({"turn_id": f"t{i}", "speaker": "Aquinas", "topic": f"topic {i % 2}", "metrics": metrics})
+        )
+    (batch / "summary.json").write_text("{}")
+    compact_batch(batch, tmp_path / "archive")
+    assert not (batch / "audits").exists()
+
+    with open(Path(__file__).resolve().parents[1] / "configs" / "default.yaml", "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    cfg["paths"]["runs"] = "runs"
+    (tmp_path / "c.yaml").write_text(yaml.safe_dump(cfg))
+    monkeypatch.setattr(sys, "argv", ["quality_gate", "--batch", "b1", "--config", "c.yaml"])
+    quality_gate.main()
+    assert sorted(p.name for p in (batch / "accepted").iterdir()) == ["t0.json", "t1.json"]
+    assert finished_batches(tmp_path / "runs") == [batch]  # reopened for the new results
+
+    compact_batch(batch, tmp_path / "archive")
+    assert not (batch / "accepted").exists()
+    monkeypatch.setattr(sys, "argv", ["pack", "--batch", "b1"])
+    pack_sft.main()
+    pack_dpo.main()
+    assert len((tmp_path / "datasets" / "sft" / "b1.jsonl").read_text().splitlines()) == 2
+    assert (tmp_path / "datasets" / "dpo" / "b1.jsonl").read_text().strip()
+    assert PackReader(tmp_path / "archive" / "b1.pack").names()  # pack still intact
@@ -0,0 +1,127 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+tokenizers = pytest.importorskip("tokenizers")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "training"))
+import sft_cache  # noqa: E402
+import train_sft_lora  # noqa: E402
+
+MAX_SEQ_LEN = 32
+RECORDS = [
+    {"instruction": f"quaestio {i}", "response": " ".join(["verbum", "est", "deus"][: 1 + i % 3] * (1 + i % 4))}
+    for i in range(8)
+]
+
+
+@pytest.fixture
+def tiny_model_dir(tmp_path):
+    """Offline word-level tokenizer plus a 1-layer Llama saved as a HF checkpoint."""
+
+    words = sorted({w for r in RECORDS for w in (r["instruction"] + " " + r["response"]).split()})
+    vocab = {"<pad>": 0, "</s>": 1, "<unk>": 2, **{w: i + 3 for i, w in enumerate(words)}}
+    tok = tokenizers.Tokenizer(tokenizers.models.WordLevel(vocab, unk_token="<unk>"))
+    tok.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    fast = transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tok, eos_token="</s>", pad_token="<pad>", unk_token="<unk>"
+    )
+    config = transformers.LlamaConfig(
+        vocab_size=len(vocab),
+        hidden_size=16,
+        intermediate_size=32,
+        num_hidden_layers=1,
+        num_attention_heads=2,
+        num_key_value_heads=2,
+        max_position_embeddings=MAX_SEQ_LEN,
+        pad_token_id=0,
+        eos_token_id=1,
+    )
+    torch.manual_seed(0)
+    path = tmp_path / "tiny-llama"
+    transformers.LlamaForCausalLM(config).save_pretrained(path)
+    fast.save_pretrained(path)
+    return path
+
+
+@pytest.fixture
+def shard(tmp_path):
+    path = tmp_path / "shard.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for r in RECORDS:
+            f.write(json.dumps(r) + "\n")
+    return path
+
+
+def test_block_mask_uses_inverted_additive_form():
+    batch = {
+        "input_ids": np.zeros((1, 4), dtype=np.int64),
+        "labels": np.zeros((1, 4), dtype=np.int64),
+        "position_ids": np.array([[0, 1, 0, 0]]),
+        "attention_mask": np.array([[1, 1, 1, 0]]),
+        "seq_lens": [np.array([2, 1])],
+    }
+    mask = train_sft_lora._model_inputs(batch, torch, "cpu", torch.float32, block_mask=True)["attention_mask"]
+    assert mask.shape == (1, 1, 4, 4)
+    blocked = torch.finfo(torch.float32).min
+    expected_open = [
+        [1, 0, 0, 0],
+        [1, 1, 0, 0],
+        [0, 0, 1, 0],  # second example cannot see the first
+        [0, 0, 0, 1],  # padding keeps only its diagonal
+    ]
+    assert (mask[0, 0] == 0).int().tolist() == expected_open
+    assert mask[0, 0][torch.tensor(expected_open) == 0].eq(blocked).all()
+
+
+def _token_loss(model, tokenizer, shard, cache_dir, pack):
+    """Summed next-token loss and label count over the whole cache."""
+
+    sft_cache.build_cache(
+        shard, cache_dir, lambda t: tokenizer(t, add_special_tokens=False)["input_ids"],
+        tokenizer.eos_token_id, MAX_SEQ_LEN, pack=pack,
+    )
+    total, count = 0.0, 0
+    with torch.no_grad():
+        for batch in sft_cache.iter_batches(sft_cache.PackedDataset(cache_dir, pad_id=0), 2):
+            out = model(**train_sft_lora._model_inputs(batch, torch, "cpu", torch.float32, block_mask=pack))
+            n = int((batch["labels"][:, 1:] != sft_cache.IGNORE_INDEX).sum())
+            total += float(out.loss) * n
+            count += n
+    return total, count
+
+
+def test_packed_loss_matches_unpacked(tiny_model_dir, shard, tmp_path):
+    tokenizer = transformers.AutoTokenizer.from_pretrained(tiny_model_dir)
+    model = transformers.AutoModelForCausalLM.from_pretrained(tiny_model_dir, attn_implementation="eager").eval()
+    packed, n_packed = _token_loss(model, tokenizer, shard, tmp_path / "packed", pack=True)
+    unpacked, n_unpacked = _token_loss(model, tokenizer, shard, tmp_path / "unpacked", pack=False)
+    assert n_packed == n_unpacked > 0
+    assert packed == pytest.approx(unpacked, rel=1e-4)
+
+
+def test_main_trains_and_writes_stats(tiny_model_dir, shard, tmp_path, monkeypatch):
+    cfg = tmp_path / "train.yaml"
+    cfg.write_text(
+        f"base_model: {tiny_model_dir}\nlora_r: 0\nlr: 1e-3\nepochs: 1\n"
+        f"per_device_train_batch_size: 1\nmax_seq_len: {MAX_SEQ_LEN}\npacking: true\nseed: 0\n",
+        encoding="utf-8",
+    )
+    out = tmp_path / "out"
+    monkeypatch.setattr(
+        sys, "argv",
+        ["train_sft_lora.py", "--config", str(cfg), "--data", str(shard), "--out", str(out),
+         "--max-steps", "2", "--device", "cpu"],
+    )
+    train_sft_lora.main()
+
+    stats = json.loads((out / "train_stats.json").read_text(encoding="utf-8"))
+    assert stats["steps"] == 2 and stats["packing"] is True
+    assert stats["tokens_per_sec"] > 0
+    assert 0.0 <= stats["padding_waste"] < stats["padding_waste_unpacked"]
+    assert stats["loss"] is not None
@@ -0,0 +1,158 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src import vector_store
+
+
+def _random_unit(n, dim, seed=0):
+    x = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_store_search_matches_exact(tmp_path, dtype, monkeypatch):
+    monkeypatch.setattr(vector_store, "SEARCH_BLOCK_ROWS", 64)  # force several blocks
+    emb = _random_unit(500, 32)
+    writer = vector_store.EmbeddingStoreWriter(tmp_path / "dense", 32, dtype=dtype)
+    writer.append(emb[:200])
+    writer.append(emb[200:])
+
+    store = vector_store.open_store(tmp_path / "dense")
+    assert len(store) == 500
+    assert isinstance(store.rows, np.memmap)
+
+    queries = _random_unit(4, 32, seed=1)
+    scores, ids = store.search(queries, 5)
+    exact = np.argsort(-(queries @ emb.T), axis=1)[:, :5]
+
+    assert ids.shape == (4, 5)
+    assert (ids[:, 0] == exact[:, 0]).all()
+    assert np.all(np.diff(scores, axis=1) <= 0)
+    assert scores == pytest.approx(np.take_along_axis(queries @ emb.T, ids, axis=1), abs=2e-2)
+
+
+def test_store_pads_when_k_exceeds_rows(tmp_path):
+    writer = vector_store.EmbeddingStoreWriter(tmp_path / "dense", 8)
+    writer.append(_random_unit(3, 8))
+    _, ids = vector_store.open_store(tmp_path / "dense").search(_random_unit(1, 8), 5)
+    assert sorted(ids[0, :3]) == [0, 1, 2]
+    assert list(ids[0, 3:]) == [-1, -1]
+
+
+def test_writer_resume_drops_partial_tail(tmp_path):
+    path = tmp_path / "dense"
+    writer = vector_store.EmbeddingStoreWriter(path, 8)
+    writer.append(_random_unit(10, 8))
+    with open(path / vector_store.ROWS_FILE, "ab") as f:
+        f.write(b"\x00" * 7)  # simulated torn write
+
+    resumed = vector_store.EmbeddingStoreWriter(path, 8)
+    assert resumed.count == 10
+    resumed.append(_random_unit(2, 8, seed=3))
+    assert len(vector_store.open_store(path)) == 12
+    assert (path / vector_store.ROWS_FILE).stat().st_size == 12 * 8 * 2
+
+
+def test_open_store_rejects_stale_fingerprint(tmp_path):
+    writer = vector_store.EmbeddingStoreWriter(tmp_path / "dense", 8, fingerprint="abc")
+    writer.append(_random_unit(2, 8))
+    assert vector_store.open_store(tmp_path / "dense", fingerprint="abc") is not None
+    assert vector_store.open_store(tmp_path / "dense", fingerprint="xyz") is None
+
+
+class _CountingModel:
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False):
+        self.calls += 1
+        return np.array([[len(t), t.count("a") + 1, 1.0] for t in texts], dtype=np.float32)
+
+
+class _FakeBM25:
+    def __init__(self, corpus):
+        self.corpus = corpus
+
+    def get_scores(self, tokens):
+        return np.array([sum(t in doc for t in tokens) for doc in self.corpus], dtype=np.float32)
+
+
+@pytest.fixture
+def store_env(tmp_path, monkeypatch):
+    import sys
+    from types import ModuleType
+
+    bm25 = ModuleType("rank_bm25")
+    bm25.BM25Okapi = _FakeBM25
+    monkeypatch.setitem(sys.modules, "rank_bm25", bm25)
+    monkeypatch.setitem(sys.modules, "faiss", None)  # any faiss use raises ImportError
+    corpora = tmp_path / "corpora"
+    corpora.mkdir()
+    for i, text in enumerate(["alpha beta", "gamma delta", "alpha gamma", "epsilon"]):
+        (corpora / f"{i}.txt").write_text(text, encoding="utf-8")
+    return corpora, tmp_path / "indices" / "dense"
+
+
+def test_concurrent_workers_build_store_once(store_env):
+    import threading
+
+    from src.debate_loop import _prepare_retrieval
+    from src.embedding_cache import CachedEncoder
+
+    corpora, store_dir = store_env
+    model = _CountingModel()
+    errors, stores = [], []
+
+    def worker():
+        try:
+            enc = CachedEncoder("test/enc", load=lambda: model)
+            stores.append(_prepare_retrieval(corpora, store_dir, "float16", enc)[3])
+        except Exception as e:  # pragma: no cover - failure path
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert model.calls == 1
+    assert {len(s) for s in stores} == {4}
+
+
+def test_store_search_does_not_need_faiss(store_env):
+    from src.debate_loop import _hybrid_search_batch, _prepare_retrieval
+    from src.embedding_cache import CachedEncoder, EmbeddingCache
+
+    corpora, store_dir = store_env
+    cache = EmbeddingCache(store_dir.parent / "embedding_cache", "test/enc")
+    docs, bm25, enc, store = _prepare_retrieval(
+        corpora, store_dir, "float16", CachedEncoder("test/enc", cache=cache, load=_CountingModel)
+    )
+    results = _hybrid_search_batch(["alpha", "gamma"], docs, bm25, enc, store, k=2)
+    assert [len(r) for r in results] == [2, 2]
+    assert len(cache) == len(docs)  # passages are cached, queries are not
+    assert {r["text"] for r in results[0]} <= set(docs)
+
+
+def test_prepare_retrieval_reuses_index_build(store_env):
+    from src import chunk_and_index
+    from src.corpus import build_corpus
+    from src.debate_loop import _prepare_retrieval
+    from src.embedding_cache import CachedEncoder
+
+    corpora, store_dir = store_env
+    model = _CountingModel()
+    chunk_and_index.build_dense_store(
+        build_corpus(corpora), store_dir.parent, workers=1, encoder_name="test/enc", load_model=lambda: model
+    )
+    assert model.calls == 1
+
+    enc = CachedEncoder("test/enc", load=lambda: model)
+    assert len(_prepare_retrieval(corpora, store_dir, "float16", enc)[3]) == 4
+    assert model.calls == 1  # same fingerprint: mapped, not re-encoded
+
+    store = _prepare_retrieval(corpora, store_dir, "int8", enc)[3]
+    assert store.dtype == "int8" and model.calls == 2
+    assert not (store_dir.parent / "dense.partial").exists()
@@ -0,0 +1,92 @@
+import sys
+from types import ModuleType
+
+import pytest
+
+from src import debate_loop
+
+
+def test_budget_reached_past_ceiling():
+    text = " ".join(["verbum"] * 10)
+    assert not debate_loop._budget_reached(text, 5, 10)  # 10th word may still be partial
+    assert debate_loop._budget_reached(text + " sub", 5, 10)
+
+
+def test_budget_waits_for_citation_complete_sentence():
+    assert not debate_loop._budget_reached("una duo tres.", 5, 10)  # below floor
+    assert debate_loop._budget_reached("una duo tres quattuor quinque.", 5, 10)
+    assert not debate_loop._budget_reached("una duo tres quattuor quinque (ST I q2.", 5, 10)
+    assert debate_loop._budget_reached("una duo tres quattuor quinque (ST I q2).", 5, 10)
+
+
+def test_trim_prefers_last_complete_sentence():
+    text = "Prima sententia est. Secunda sententia longior est hic. Tertia incompleta et"
+    assert debate_loop._trim_to_words(text, 9, 2) == "Prima sententia est. Secunda sententia longior est hic."
+    assert debate_loop._trim_to_words(text, 2) == "Prima sententia"
+    assert debate_loop._trim_to_words("brevis textus.", 9) == "brevis textus."
+
+
+def test_trim_keeps_line_breaks():
+    text = "  Prima sententia est.\n\nSecunda\tsententia est.\nTertia incompleta et"
+    assert debate_loop._trim_to_words(text, 7, 2) == "Prima sententia est.\n\nSecunda\tsententia est."
+    assert debate_loop._trim_to_words(text, 4, 4) == "Prima sententia est.\n\nSecunda"
+
+
+class FakeIds(list):
+    """List of token rows exposing ``shape`` like a tensor."""
+
+    @property
+    def shape(self):
+        return (len(self), len(self[0]))
+
+
+class WordTokenizer:
+    def decode(self, ids, skip_special_tokens=True):
+        return " ".join(ids)
+
+
+@pytest.fixture
+def fake_torch(monkeypatch):
+    torch = ModuleType("torch")
+    torch.bool = bool
+    torch.tensor = lambda data, dtype=None, device=None: list(data)
+    monkeypatch.setitem(sys.modules, "torch", torch)
+    return torch
+
+
+def test_stopping_criteria_is_per_sequence(fake_torch):
+    crit = debate_loop.WordBudgetStoppingCriteria(WordTokenizer(), prompt_len=1, min_words=2, max_words=4)
+    rows = FakeIds([["P", "a", "b."], ["P", "a", "b"]])
+    assert crit(rows, None) == [True, False]
+
+    rows = FakeIds([["P", "a", "b.", "c"], ["P", "a", "b", "c"]])
+    assert crit(rows, None) == [True, False]
+    assert crit.stop_steps == [2, None]
+
+    rows = FakeIds([["P", "a", "b.", "c", "d"], ["P", "a", "b", "c", "d"]])
+    assert crit(rows, None) == [True, False]
+
+    rows = FakeIds([["P", "a", "b.", "c", "d", "e"], ["P", "a", "b", "c", "d", "e"]])
+    assert crit(rows, None) == [True, True]
+    assert crit.stop_steps == [2, 5]
+
+
+def _count(text):
+    return len(text.split())
+
+
+def test_account_turn_trims_partial_overrun():
+    raw = "Prima sententia est. Secunda sententia hic finitur. sub"
+    turn = debate_loop._account_turn(raw, 9, _count, 2, 7)
+    assert turn["text"] == "Prima sententia est. Secunda sententia hic finitur."
+    assert turn["outcome"] == "ok"
+    assert (turn["kept_tokens"], turn["trimmed_tokens"], turn["wasted_tokens"]) == (7, 2, 0)
+
+
+def test_account_turn_wastes_turns_outside_gate_rules():
+    short = debate_loop._account_turn("Brevis.", 3, _count, 5, 10)
+    assert short["outcome"] == "short" and short["wasted_tokens"] == 3
+
+    runon = debate_loop._account_turn(" ".join(["verbum"] * 11), 12, _count, 5, 10)
+    assert runon["outcome"] == "no_sentence_end" and runon["words"] == 10
+    assert runon["wasted_tokens"] == 12
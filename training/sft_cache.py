@@ -0,0 +1,279 @@
+"""training/sft_cache.py
+=====================
+
+Pre-tokenized, sequence-packed cache for SFT shards.
+
+SFT records are short (120–180 word turns), so padding each one to
+``max_seq_len`` wastes most of every batch.  This module tokenizes a JSONL
+shard once into memory-mapped arrays and packs several examples into each
+``max_seq_len`` row with best-fit-decreasing bin packing.
+
+Cache layout (``<cache_dir>/``)::
+
+    meta.json      # source fingerprint, tokenizer, max_seq_len, stats
+    tokens.bin     # uint32, all examples concatenated
+    loss_mask.bin  # uint8, 1 where the token belongs to the response
+    docs.bin       # int64 pairs (start, length) per example
+    packs.bin      # int64 example ids, grouped by pack
+    pack_offsets.bin  # int64, pack i uses packs[offsets[i]:offsets[i+1]]
+
+:class:`PackedDataset` streams packed rows straight from the memmaps, so the
+dataset is never loaded into RAM as a whole.  Every row carries
+``position_ids`` that restart at each example and ``seq_lens`` from which a
+block-diagonal causal mask is built, so packed examples never attend to each
+other.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+IGNORE_INDEX = -100
+
+META_FILE = "meta.json"
+
+
+def _source_fingerprint(path: Path) -> Dict:
+    st = Path(path).stat()
+    return {"path": str(Path(path).resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def format_example(record: Dict) -> Sequence[str]:
+    """Split an SFT record into ``(prompt, response)`` text."""
+
+    return f"{record['instruction']}\n\n", record["response"]
+
+
+def pack_lengths(lengths: Sequence[int], max_seq_len: int) -> List[List[int]]:
+    """Group example indices into bins of at most ``max_seq_len`` tokens.
+
+    Best-fit decreasing: examples are placed longest first into the open bin
+    with the least remaining room that still fits them.
+    """
+
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    bins: List[List[int]] = []
+    # Sorted (remaining, bin_id) pairs of bins that still have room.
+    free: List[tuple] = []
+    for i in order:
+        n = min(lengths[i], max_seq_len)
+        pos = bisect.bisect_left(free, (n, -1))
+        if pos < len(free):
+            remaining, b = free.pop(pos)
+        else:
+            b, remaining = len(bins), max_seq_len
+            bins.append([])
+        bins[b].append(i)
+        remaining -= n
+        if remaining > 0:
+            bisect.insort(free, (remaining, b))
+    return bins
+
+
+def build_cache(
+    data_path: Path,
+    cache_dir: Path,
+    encode: Callable[[str], List[int]],
+    eos_id: int,
+    max_seq_len: int,
+    tokenizer_name: str = "",
+    pack: bool = True,
+) -> Dict:
+    """Tokenize ``data_path`` into ``cache_dir`` unless an up-to-date cache exists.
+
+    With ``pack=False`` every example gets its own row (for models that cannot
+    take a block-diagonal attention mask).  Returns the cache metadata,
+    including packing statistics.
+    """
+
+    cache_dir = Path(cache_dir)
+    source = _source_fingerprint(data_path)
+    key = {"source": source, "tokenizer": tokenizer_name, "max_seq_len": max_seq_len, "pack": pack}
+    meta_path = cache_dir / META_FILE
+    if meta_path.exists():
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("key") == key:
+            return meta
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    meta_path.unlink(missing_ok=True)
+
+    lengths: List[int] = []
+    start = 0
+    docs = []
+    with open(data_path, "r", encoding="utf-8") as src, open(
+        cache_dir / "tokens.bin", "wb"
+    ) as tok_f, open(cache_dir / "loss_mask.bin", "wb") as mask_f:
+        for line in src:
+            if not line.strip():
+                continue
+            prompt, response = format_example(json.loads(line))
+            p_ids = encode(prompt)
+            r_ids = list(encode(response)) + [eos_id]
+            ids = (list(p_ids) + r_ids)[:max_seq_len]
+            mask = ([0] * len(p_ids) + [1] * len(r_ids))[:max_seq_len]
+            tok_f.write(np.asarray(ids, dtype=np.uint32).tobytes())
+            mask_f.write(np.asarray(mask, dtype=np.uint8).tobytes())
+            docs.append((start, len(ids)))
+            lengths.append(len(ids))
+            start += len(ids)
+
+    np.asarray(docs, dtype=np.int64).reshape(-1, 2).tofile(cache_dir / "docs.bin")
+
+    bins = pack_lengths(lengths, max_seq_len) if pack else [[i] for i in range(len(lengths))]
+    offsets = np.zeros(len(bins) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in bins])
+    flat = np.asarray([i for b in bins for i in b], dtype=np.int64)
+    flat.tofile(cache_dir / "packs.bin")
+    offsets.tofile(cache_dir / "pack_offsets.bin")
+
+    total_tokens = int(sum(lengths))
+    meta = {
+        "key": key,
+        "examples": len(lengths),
+        "packs": len(bins),
+        "tokens": total_tokens,
+        "max_seq_len": max_seq_len,
+        "padding_waste": padding_waste(total_tokens, len(bins), max_seq_len),
+        "padding_waste_unpacked": padding_waste(total_tokens, len(lengths), max_seq_len),
+    }
+    tmp = cache_dir / (META_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, meta_path)
+    return meta
+
+
+def padding_waste(real_tokens: int, rows: int, max_seq_len: int) -> float:
+    """Fraction of ``rows x max_seq_len`` slots that hold padding."""
+
+    slots = rows * max_seq_len
+    return 1.0 - real_tokens / slots if slots else 0.0
+
+
+def block_causal_mask(seq_lens: Sequence[int], max_seq_len: int) -> np.ndarray:
+    """Boolean ``(L, L)`` mask: causal within each packed example, blocked across."""
+
+    mask = np.zeros((max_seq_len, max_seq_len), dtype=bool)
+    start = 0
+    for n in seq_lens:
+        mask[start : start + n, start : start + n] = np.tril(np.ones((n, n), dtype=bool))
+        start += n
+    return mask
+
+
+class PackedDataset:
+    """Iterate packed rows from a cache directory without loading it into RAM.
+
+    Each item is a dict of numpy arrays of length ``max_seq_len``:
+    ``input_ids``, ``labels`` (``IGNORE_INDEX`` on prompt and padding),
+    ``position_ids`` (restarting per example), ``attention_mask`` (1 on real
+    tokens) and ``seq_lens`` (example lengths, for block-diagonal masks or
+    ``cu_seqlens`` in varlen attention kernels).
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        pad_id: int = 0,
+        shuffle: bool = False,
+        seed: int = 0,
+        rank: int = 0,
+        world_size: int = 1,
+    ):
+        cache_dir = Path(cache_dir)
+        with open(cache_dir / META_FILE, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.max_seq_len = self.meta["max_seq_len"]
+        self.pad_id = pad_id
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        self.rank = rank
+        self.world_size = world_size
+
+        def _map(name, dtype, shape=None):
+            path = cache_dir / name
+            if path.stat().st_size == 0:
+                return np.zeros(shape or (0,), dtype=dtype)
+            return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+        self.tokens = _map("tokens.bin", np.uint32)
+        self.loss_mask = _map("loss_mask.bin", np.uint8)
+        self.docs = _map("docs.bin", np.int64).reshape(-1, 2)
+        self.packs = _map("packs.bin", np.int64)
+        self.offsets = np.fromfile(cache_dir / "pack_offsets.bin", dtype=np.int64)
+
+    def __len__(self) -> int:
+        n = len(self.offsets) - 1
+        return len(range(self.rank, n, self.world_size))
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def row(self, i: int) -> Dict[str, np.ndarray]:
+        L = self.max_seq_len
+        input_ids = np.full(L, self.pad_id, dtype=np.int64)
+        labels = np.full(L, IGNORE_INDEX, dtype=np.int64)
+        position_ids = np.zeros(L, dtype=np.int64)
+        attention_mask = np.zeros(L, dtype=np.int64)
+        seq_lens = []
+        pos = 0
+        for doc in self.packs[self.offsets[i] : self.offsets[i + 1]]:
+            start, n = self.docs[doc]
+            ids = self.tokens[start : start + n].astype(np.int64)
+            input_ids[pos : pos + n] = ids
+            labels[pos : pos + n] = np.where(self.loss_mask[start : start + n] == 1, ids, IGNORE_INDEX)
+            position_ids[pos : pos + n] = np.arange(n)
+            attention_mask[pos : pos + n] = 1
+            seq_lens.append(int(n))
+            pos += n
+        return {
+            "input_ids": input_ids,
+            "labels": labels,
+            "position_ids": position_ids,
+            "attention_mask": attention_mask,
+            "seq_lens": np.asarray(seq_lens, dtype=np.int64),
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, np.ndarray]]:
+        order = np.arange(len(self.offsets) - 1)
+        if self.shuffle:
+            np.random.default_rng(self.seed + self.epoch).shuffle(order)
+        for i in order[self.rank :: self.world_size]:
+            yield self.row(int(i))
+
+
+def iter_batches(dataset: PackedDataset, batch_size: int, drop_last: bool = False) -> Iterator[Dict]:
+    """Stack consecutive rows into batches; ``seq_lens`` stays a list per row."""
+
+    buf: List[Dict[str, np.ndarray]] = []
+    for row in dataset:
+        buf.append(row)
+        if len(buf) == batch_size:
+            yield _stack(buf)
+            buf = []
+    if buf and not drop_last:
+        yield _stack(buf)
+
+
+def _stack(rows: List[Dict[str, np.ndarray]]) -> Dict:
+    batch = {k: np.stack([r[k] for r in rows]) for k in rows[0] if k != "seq_lens"}
+    batch["seq_lens"] = [r["seq_lens"] for r in rows]
+    return batch
+
+
+def cache_dir_for(data_path: Path, out_dir: Optional[Path] = None) -> Path:
+    """Default cache location: ``<out>/cache`` or ``<data>.cache`` beside the shard."""
+
+    if out_dir is not None:
+        return Path(out_dir) / "cache"
+    data_path = Path(data_path)
+    return data_path.with_name(data_path.name + ".cache")